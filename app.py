@@ -2,60 +2,136 @@
 WaterMarks Backend - FastAPI Application
 Main application file with all API endpoints
 """
+import asyncio
 import os
-import threading
 import time
 from typing import Optional
 from datetime import datetime, timedelta
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Response, Cookie
-from fastapi.responses import FileResponse, JSONResponse
+import anyio
+import orjson
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Response, Cookie, Header, Query
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.background import BackgroundTask
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from pydantic import BaseModel
-from dotenv import load_dotenv
-import psutil
 
 import config
 from modules.validator import (
     check_size_allowance,
     validate_file_size_on_upload,
-    validate_pdf_structure
+    validate_pdf_structure,
+    format_bytes,
+    PDFStreamSniffer
 )
-from modules.processor import process_pdf_with_watermarks
 from modules.status_manager import get_status_manager
-from modules.queue_manager import get_queue_manager
+from modules.queue_manager import get_queue_manager, get_job_slot_count
 from modules.session_manager import get_or_create_session
+from modules.worker_pool import JobWorkerPool
 from utils.helpers import (
     generate_job_id,
     ensure_directories_exist,
     cleanup_job_files,
-    is_allowed_file
+    is_allowed_file,
+    is_valid_job_id,
+    open_for_write
 )
+from utils.sysinfo import get_virtual_memory
+from utils.logger import get_logger
 
-# Load environment variables
-load_dotenv()
+logger = get_logger("watermarks.app")
 
 # Initialize FastAPI app
 app = FastAPI(
     title="WaterMarks Backend API",
     description="PDF Watermarking Service - Split, watermark, and merge PDFs",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Configure CORS
-# Note: Cannot use allow_origins=["*"] with allow_credentials=True (CORS spec violation)
-# For local dev, we explicitly list localhost origins
-cors_origins = config.CORS_ORIGINS if not config.DEBUG else [
-    "http://localhost:3000",
-    "http://localhost:5173",
-    "http://localhost:5174",
-    "http://127.0.0.1:3000",
-    "http://127.0.0.1:5173",
-    "http://127.0.0.1:5174",
-]
 
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Encode error responses with orjson too (FastAPI's default handler uses stdlib json)"""
+    return ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=getattr(exc, "headers", None))
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """Gzip JSON responses, but pass PDF downloads through untouched (already compressed)"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/api/download/"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject oversize uploads (413) and uploads the queue can't take right now (503)
+    from their Content-Length header, before any of the body is read (FastAPI would
+    otherwise spool the whole multipart body first).
+    """
+    
+    UPLOAD_PATHS = {"/api/upload", "/api/upload-stream"}
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.UPLOAD_PATHS:
+            file_size = self._declared_file_size(scope)
+            if file_size is not None:
+                detail = self._check_file_size(file_size)
+                if detail:
+                    response = ORJSONResponse({"detail": detail}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                try:
+                    await asyncio.to_thread(ensure_queue_can_accept, None, file_size)
+                except HTTPException as exc:
+                    response = ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+    
+    @staticmethod
+    def _declared_file_size(scope) -> Optional[int]:
+        """File size implied by the Content-Length header, or None if not declared"""
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    body_size = int(value)
+                except ValueError:
+                    return None
+                break
+        else:
+            return None  # Chunked body - size is enforced while writing
+        
+        # Multipart bodies carry boundaries and part headers around the file
+        if scope["path"] == "/api/upload":
+            body_size = max(body_size - config.MULTIPART_OVERHEAD_ALLOWANCE, 0)
+        return body_size
+    
+    @staticmethod
+    def _check_file_size(body_size: int) -> Optional[str]:
+        """Return an error message if the declared file is too large, else None"""
+        if body_size > config.ABSOLUTE_MAX_FILE_SIZE:
+            return f"File too large. Maximum allowed: {format_bytes(config.ABSOLUTE_MAX_FILE_SIZE)}"
+        
+        size_check = validate_file_size_on_upload(body_size)
+        return None if size_check.is_valid else size_check.message
+
+
+# Added before CORS so CORS (outermost) still decorates 413 responses
+app.add_middleware(JSONGZipMiddleware, minimum_size=config.GZIP_MIN_SIZE)
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=cors_origins,
+    allow_origins=list(config.ALLOWED_CORS_ORIGINS),  # Resolved once in config (DEBUG -> localhost list)
     allow_credentials=True,
     allow_methods=["OPTIONS", "GET", "POST", "PUT", "DELETE", "PATCH", "HEAD"],  # Explicitly list all methods
     allow_headers=["*"],
@@ -97,12 +173,41 @@ class StatusResponse(BaseModel):
     message: str
     result_path: Optional[str] = None
     error: Optional[str] = None
+    version: Optional[int] = None
     queue_position: Optional[int] = None
     jobs_ahead: Optional[int] = None
     estimated_wait_seconds: Optional[int] = None
     estimated_start_time: Optional[str] = None
 
 
+class PDFFileResponse(FileResponse):
+    """
+    FileResponse that sends the file in large blocks (Starlette reads 64KB at a time).
+    When the ASGI server supports the pathsend extension, the server sends the
+    file itself (sendfile) and no bytes pass through Python.
+    """
+    chunk_size = config.DOWNLOAD_CHUNK_SIZE
+    
+    async def __call__(self, scope, receive, send):
+        # Headers (incl. Content-Length) come from stat_result, so it must have been given
+        if "http.response.pathsend" not in scope.get("extensions", {}) or self.stat_result is None:
+            await super().__call__(scope, receive, send)
+            return
+        
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers
+        })
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        
+        if self.background is not None:
+            await self.background()
+
+
 class ServerBusyResponse(BaseModel):
     error: str
     message: str
@@ -115,75 +220,124 @@ class ServerBusyResponse(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
+    global job_pool, queue_processor_task, status_cleanup_task
     ensure_directories_exist()
     
+    # Shared process pool for PDF processing (workers report back via handle_job_event).
+    # Slots are capped so that many worst-case jobs fit in the container at once.
+    job_pool = JobWorkerPool(on_event=handle_job_event, max_workers=get_job_slot_count())
+    
     # Start background queue processor
-    def queue_processor():
-        print("🚀 [QUEUE] Queue processor thread started")
+    async def queue_processor():
+        logger.info("🚀 [QUEUE] Queue processor task started")
+        loop = asyncio.get_running_loop()
         while True:
             try:
-                # Try to get next job from queue
-                next_job = queue_manager.pop_next_job()
+                # Read before looking at the queue so a change made meanwhile isn't missed
+                seen = queue_manager.change_count
                 
-                if next_job:
-                    print(f"📤 [QUEUE] Popped job {next_job['job_id']} from queue")
-                    # Launch job in its own thread for concurrent processing
-                    job_thread = threading.Thread(
-                        target=process_queued_job,
-                        args=(next_job,),
-                        daemon=True,
-                        name=f"Job-{next_job['job_id'][:8]}"
-                    )
-                    job_thread.start()
-                    print(f"🧵 [QUEUE] Launched thread for job {next_job['job_id']}")
-                    # Immediately check for next job (allows concurrent processing)
-                    time.sleep(0.5)
-                else:
-                    # No job ready or not enough memory, wait a bit
-                    time.sleep(2)
+                # Only pop a job when a worker is free to run it
+                if job_pool.has_free_slot():
+                    # Try to get next job from queue (resource checks block, so run them off the loop)
+                    next_job = await loop.run_in_executor(None, queue_manager.pop_next_job)
+                    
+                    if next_job:
+                        logger.debug("📤 [QUEUE] Popped job %s from queue", next_job['job_id'])
+                        # Hand job to the shared process pool for concurrent processing
+                        process_queued_job(next_job)
+                        logger.info("🧵 [QUEUE] Submitted job %s to worker pool", next_job['job_id'])
+                        # Immediately check for next job (allows concurrent processing)
+                        continue
+                
+                # Sleep until a job is added or finishes. Jobs waiting on memory are
+                # re-checked after a short timeout (RAM can free up without a queue change).
+                timeout = config.QUEUE_RECHECK_SECONDS if queue_manager.get_queue_count() else config.QUEUE_IDLE_WAIT_SECONDS
+                await asyncio.to_thread(queue_manager.wait_for_change, seen, timeout)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print(f"❌ Queue processor error: {e}")
-                import traceback
-                traceback.print_exc()
-                time.sleep(5)
+                logger.exception("❌ Queue processor error: %s", e)
+                await asyncio.sleep(5)
+    
+    queue_processor_task = asyncio.create_task(queue_processor())
+    
+    # Periodically drop job statuses older than the retention time
+    async def status_cleanup():
+        while True:
+            await asyncio.sleep(config.STATUS_CLEANUP_INTERVAL)
+            try:
+                count = await asyncio.to_thread(status_manager.cleanup_old_jobs)
+                if count:
+                    logger.info("🧹 [CLEANUP] Removed %d old job statuses", count)
+            except Exception as e:
+                logger.error("❌ Status cleanup error: %s", e)
+    
+    status_cleanup_task = asyncio.create_task(status_cleanup())
+    
+    logger.info("✅ WaterMarks Backend started successfully")
+    logger.info("📁 Temp directory: %s", config.TEMP_DIR)
+    logger.info("🎨 Watermark colors: %d colors available", len(config.WATERMARK_COLORS))
+    logger.info("🔄 Queue processor started")
+
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks and taking jobs from the queue, then let running jobs finish"""
+    for task in (queue_processor_task, status_cleanup_task):
+        if task is not None:
+            task.cancel()
+    # Release the queue processor's waiting thread so the executor can shut down promptly
+    queue_manager.wake()
+    for task in (queue_processor_task, status_cleanup_task):
+        if task is not None:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
     
-    thread = threading.Thread(target=queue_processor, daemon=True)
-    thread.start()
+    if job_pool is not None:
+        # Waits for in-flight jobs so result PDFs aren't cut off mid-write
+        await asyncio.get_running_loop().run_in_executor(None, job_pool.shutdown)
+        logger.info("🛑 [QUEUE] Worker pool shut down")
     
-    print("✅ WaterMarks Backend started successfully")
-    print(f"📁 Temp directory: {config.TEMP_DIR}")
-    print(f"🎨 Watermark colors: {len(config.WATERMARK_COLORS)} colors available")
-    print(f"🔄 Queue processor started")
+    # Write any queue changes still waiting for the flusher
+    queue_manager.flush()
+
+
+# Wake-up endpoints are hit constantly; the root body never changes, so encode it once
+ROOT_RESPONSE_BODY = orjson.dumps({
+    "service": "WaterMarks Backend",
+    "status": "online",
+    "version": "1.0.0"
+})
 
 
 # Health check endpoint
 @app.get("/")
 async def root():
     """Root endpoint - health check"""
-    return {
-        "service": "WaterMarks Backend",
-        "status": "online",
-        "version": "1.0.0"
-    }
+    return Response(content=ROOT_RESPONSE_BODY, media_type="application/json")
 
 
+# Plain def: the status manager may block on Redis, so this runs in the threadpool
 @app.get("/health")
-async def health_check():
+def health_check():
     """
     Health check endpoint for monitoring and Render wake-up.
     Returns 200 OK if server is healthy + queue status.
     """
-    import psutil
-    
     try:
-        memory = psutil.virtual_memory()
+        memory = get_virtual_memory()
         return {
             "status": "healthy",
             "server": "running",
             "active_jobs": status_manager.count_active_jobs(),
             "queue": {
                 "queued_jobs": queue_manager.get_queue_count(),
-                "processing_jobs": queue_manager.get_processing_count()
+                "processing_jobs": queue_manager.get_processing_count(),
+                "worker_slots": job_pool.max_workers if job_pool else 0,
+                "busy_workers": job_pool.in_flight_count() if job_pool else 0
             },
             "memory": {
                 "available_mb": round(memory.available / (1024 * 1024), 2),
@@ -202,94 +356,112 @@ async def health_check():
 @app.get("/ping")
 async def ping():
     """Simple ping endpoint for wake-up calls"""
-    return {"pong": True, "timestamp": time.time()}
+    # Returning a Response skips FastAPI's jsonable_encoder pass over the dict
+    return Response(
+        content=orjson.dumps({"pong": True, "timestamp": time.time()}),
+        media_type="application/json"
+    )
 
 
 def process_queued_job(job: dict):
     """
-    Background function to process a job from queue.
+    Start processing a job popped from the queue.
+    The work runs in the shared worker process pool; progress and the
+    result come back through handle_job_event.
     
     Args:
         job: Job dict from queue
     """
     job_id = job['job_id']
-    print(f"🔄 [QUEUE] Processing job {job_id}")
+    logger.info("🔄 [QUEUE] Processing job %s", job_id)
+    
+    # Update status to processing (job already created in upload endpoint)
+    logger.debug("📝 [STATUS] Updating %s to 'processing'", job_id)
+    status_manager.update_status(job_id, status="processing", message="Starting processing from queue")
     
+    # NOTE: Cannot use signal.alarm() timeout here because jobs run in pool workers
+    # Render has infrastructure-level timeouts that will handle long-running requests
     try:
-        # Update status to processing (job already created in upload endpoint)
-        print(f"📝 [STATUS] Updating {job_id} to 'processing'")
-        status_manager.update_status(job_id, status="processing", message="Starting processing from queue")
-        
-        def status_callback(status, progress=None):
-            print(f"📝 [STATUS] Job {job_id} -> {status}" + (f" ({progress}%)" if progress else ""))
-            if progress is not None:
-                status_manager.update_status(job_id, status=status, progress=progress)
-            else:
-                status_manager.update_status(job_id, status=status)
-        
-        # NOTE: Cannot use signal.alarm() timeout here because this runs in a background thread
-        # Python's signal module only works in the main thread
-        # Render has infrastructure-level timeouts that will handle long-running requests
-        
-        result_path = process_pdf_with_watermarks(
-            input_pdf_path=job['file_path'],
-            chunk_size=job['chunk_size'],
-            job_id=job_id,
-            status_callback=status_callback
-        )
-        
+        job_pool.submit(job)
+    except Exception as e:
+        handle_job_event(job_id, "error", "failed", str(e))
+
+
+def handle_job_event(job_id: str, kind: str, payload, detail):
+    """
+    Apply an event reported by a worker process to the status and queue managers.
+    
+    Args:
+        job_id: Job identifier
+        kind: "status", "finished", "error" or "requeue"
+        payload: Status name, result path, or error kind (depending on kind)
+        detail: Progress percentage or error message (depending on kind)
+    """
+    if kind == "status":
+        if detail is not None:
+            logger.debug("📝 [STATUS] Job %s -> %s (%s%%)", job_id, payload, detail)
+            status_manager.update_status(job_id, status=payload, progress=detail)
+        else:
+            logger.debug("📝 [STATUS] Job %s -> %s", job_id, payload)
+            status_manager.update_status(job_id, status=payload)
+        return
+    
+    if kind == "finished":
         # Update final status
         status_manager.update_status(
             job_id,
             status="finished",
             message="PDF processed successfully. Download within 1 minute.",
-            result_path=result_path
+            result_path=payload
         )
         
         # Mark as finished in queue (starts 1-minute timer)
         queue_manager.mark_finished(job_id)
-        
-    except MemoryError as e:
-        error_msg = f"Memory exhausted: {str(e)}. Please try a smaller file."
-        status_manager.update_status(
-            job_id,
-            status="error",
-            message="Server out of memory",
-            error=error_msg
-        )
-        queue_manager.mark_error(job_id, error_msg)
-        cleanup_job_files(job_id)
-        
-    except TimeoutError as e:
+        return
+    
+    if kind == "requeue":
+        # Job never started before its worker pool broke - run it again
+        logger.warning("🔁 [QUEUE] Re-queueing job %s", job_id)
+        queue_manager.requeue_job(job_id)
+        status_manager.update_status(job_id, status="queued", message="Queued for processing")
+        return
+    
+    # kind == "error"
+    if payload == "memory":
+        message = "Server out of memory"
+        error_msg = f"Memory exhausted: {detail}. Please try a smaller file."
+    elif payload == "timeout":
+        logger.warning("⏱️ [TIMEOUT] Job %s timed out: %s", job_id, detail)
+        message = "Processing timeout"
         error_msg = "Processing timed out. Try using larger chunk sizes or smaller file."
-        print(f"⏱️ [TIMEOUT] Job {job_id} timed out: {str(e)}")
-        status_manager.update_status(
-            job_id,
-            status="error",
-            message="Processing timeout",
-            error=error_msg
-        )
-        queue_manager.mark_error(job_id, error_msg)
-        cleanup_job_files(job_id)
-        
-    except Exception as e:
-        error_msg = str(e)
+    elif payload == "crashed":
+        message = "Processing worker terminated"
+        error_msg = f"Processing worker terminated unexpectedly ({detail})."
+    else:
+        message = "Processing failed"
+        error_msg = detail
         if "memory" in error_msg.lower() or "overflow" in error_msg.lower():
             error_msg = f"Processing failed due to insufficient memory. Error: {error_msg}"
-        
-        status_manager.update_status(
-            job_id,
-            status="error",
-            message="Processing failed",
-            error=error_msg
-        )
-        queue_manager.mark_error(job_id, error_msg)
-        cleanup_job_files(job_id)
+    
+    status_manager.update_status(
+        job_id,
+        status="error",
+        message=message,
+        error=error_msg
+    )
+    queue_manager.mark_error(job_id, error_msg)
+    cleanup_job_files(job_id)
+
+
+# Shared process pool for PDF processing (created in startup_event)
+job_pool: Optional[JobWorkerPool] = None
+queue_processor_task: Optional[asyncio.Task] = None
+status_cleanup_task: Optional[asyncio.Task] = None
 
 
 # API Endpoints
 @app.post("/api/check-size", response_model=SizeCheckResponse)
-async def check_file_size(
+def check_file_size(
     request: SizeCheckRequest,
     response: Response,
     session_id: Optional[str] = Cookie(default=None)
@@ -336,8 +508,133 @@ async def check_file_size(
         raise HTTPException(status_code=500, detail=f"Error checking file size: {str(e)}")
 
 
+def ensure_queue_can_accept(session: Optional[str], file_size: int):
+    """
+    Raise 503 with retry info if the queue can't take a job of this size.
+    
+    Args:
+        session: User session identifier (None before the session is resolved)
+        file_size: File size in bytes (declared or actual)
+    """
+    logger.debug("🔍 [UPLOAD] Checking if queue can accept job (session: %s, size: %d)", session, file_size)
+    can_accept, message, retry_info = queue_manager.can_accept_job(session, file_size)
+    
+    if not can_accept and retry_info:
+        # Server busy - return 503 with retry info
+        retry_time = datetime.now() + timedelta(seconds=retry_info['retry_after_seconds'])
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "Server at capacity",
+                "message": f"{message} Please try again in {retry_info['retry_after_seconds'] // 60} minutes.",
+                "retry_after_seconds": retry_info['retry_after_seconds'],
+                "retry_after_time": retry_time,  # orjson encodes datetimes as ISO 8601
+                "reason": retry_info['reason']
+            }
+        )
+
+
+def declared_body_size(request: Request) -> Optional[int]:
+    """Content-Length of the request, or None if absent or invalid"""
+    try:
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def enqueue_uploaded_file(
+    session: str,
+    job_id: str,
+    upload_path: str,
+    file_size: int,
+    chunk_size: int,
+    sniffer: PDFStreamSniffer,
+    capacity_checked: bool
+) -> UploadResponse:
+    """
+    Admit an uploaded file that is already on disk into the processing queue.
+    Removes the file if the queue rejects it or it is not a valid PDF.
+    
+    Args:
+        session: User session identifier
+        job_id: Job identifier
+        upload_path: Path of the uploaded file on disk
+        file_size: File size in bytes
+        chunk_size: Number of pages per chunk
+        sniffer: Head/tail bytes recorded while the file was written
+        capacity_checked: True if UploadSizeLimitMiddleware already checked queue capacity from Content-Length
+        
+    Returns:
+        UploadResponse with job_id (raises 503 if server busy, 400 if invalid PDF)
+    """
+    # Cheap check from the bytes seen during upload (no re-read of the file)
+    sniff_result = sniffer.validate()
+    if not sniff_result.is_valid:
+        os.remove(upload_path)
+        raise HTTPException(status_code=400, detail=sniff_result.message)
+    
+    # No Content-Length (chunked body) - check capacity now that the size is known
+    if not capacity_checked:
+        try:
+            ensure_queue_can_accept(session, file_size)
+        except HTTPException:
+            os.remove(upload_path)
+            raise
+    
+    # Validate PDF structure
+    pdf_validation = validate_pdf_structure(upload_path, file_size)
+    if not pdf_validation.is_valid:
+        os.remove(upload_path)  # Clean up
+        raise HTTPException(status_code=400, detail=pdf_validation.message)
+    
+    # Add to queue
+    logger.info("➕ [QUEUE] Adding job %s to queue", job_id)
+    queue_manager.add_job(
+        job_id=job_id,
+        session_id=session,
+        file_path=upload_path,
+        file_size=file_size,
+        chunk_size=chunk_size
+    )
+    
+    # Create status tracking
+    logger.debug("📝 [STATUS] Creating job %s with status 'queued'", job_id)
+    status_manager.create_job(job_id, "Queued for processing")
+    
+    return UploadResponse(
+        job_id=job_id,
+        message="File uploaded successfully. Added to processing queue."
+    )
+
+
+def copy_upload_to_disk(source, upload_path: str, sniffer: PDFStreamSniffer) -> int:
+    """
+    Copy a spooled upload to disk in fixed-size chunks, feeding the sniffer.
+    Stops as soon as ABSOLUTE_MAX_FILE_SIZE is crossed.
+    
+    Args:
+        source: Binary file object (UploadFile.file)
+        upload_path: Destination path
+        sniffer: Sniffer to feed with the copied bytes
+        
+    Returns:
+        Number of bytes read (greater than the limit if the copy was cut short)
+    """
+    source.seek(0)
+    file_size = 0
+    with open_for_write(upload_path) as buffer:
+        while chunk := source.read(config.UPLOAD_CHUNK_SIZE):
+            file_size += len(chunk)
+            if file_size > config.ABSOLUTE_MAX_FILE_SIZE:
+                break
+            sniffer.feed(chunk)
+            buffer.write(chunk)
+    return file_size
+
+
 @app.post("/api/upload", response_model=UploadResponse)
 async def upload_pdf(
+    request: Request,
     response: Response,
     file: UploadFile = File(...),
     chunk_size: int = Form(default=config.DEFAULT_CHUNK_SIZE),
@@ -355,15 +652,15 @@ async def upload_pdf(
     Returns:
         UploadResponse with job_id or 503 if server busy
     """
-    print(f"📤 [UPLOAD] Received upload request for file: {file.filename}")
+    logger.debug("📤 [UPLOAD] Received upload request for file: %s", file.filename)
     try:
         # Get or create session
-        print(f"🔑 [UPLOAD] Getting/creating session for: {session_id}")
+        logger.debug("🔑 [UPLOAD] Getting/creating session for: %s", session_id)
         session = get_or_create_session(session_id)
         response.set_cookie(key="session_id", value=session, httponly=True, max_age=86400)
         
         # Validate file type
-        print(f"✅ [UPLOAD] Validating file type: {file.filename}")
+        logger.debug("✅ [UPLOAD] Validating file type: %s", file.filename)
         if not is_allowed_file(file.filename):
             raise HTTPException(
                 status_code=400,
@@ -371,74 +668,131 @@ async def upload_pdf(
             )
         
         # Validate chunk size
-        print(f"✅ [UPLOAD] Validating chunk_size: {chunk_size}")
+        logger.debug("✅ [UPLOAD] Validating chunk_size: %d", chunk_size)
         if chunk_size <= 0:
             raise HTTPException(
                 status_code=400,
                 detail="Chunk size must be greater than 0"
             )
         
-        # Read file
-        print(f"📖 [UPLOAD] Reading file content...")
-        content = await file.read()
-        file_size = len(content)
-        print(f"📖 [UPLOAD] File read complete. Size: {file_size} bytes")
-        
-        # Check if queue can accept this job (accounting for file already in memory)
-        print(f"🔍 [UPLOAD] Checking if queue can accept job (session: {session}, size: {file_size})")
-        # NOTE: File is already in RAM at this point, so subtract it from available RAM during check
-        can_accept, message, retry_info = queue_manager.can_accept_job(session, file_size, file_in_memory=True)
-        
-        if not can_accept:
-            # Release memory before rejecting
-            del content
-            # Server busy - return 503 with retry info
-            if retry_info:
-                retry_time = datetime.now() + timedelta(seconds=retry_info['retry_after_seconds'])
-                raise HTTPException(
-                    status_code=503,
-                    detail={
-                        "error": "Server at capacity",
-                        "message": f"{message} Please try again in {retry_info['retry_after_seconds'] // 60} minutes.",
-                        "retry_after_seconds": retry_info['retry_after_seconds'],
-                        "retry_after_time": retry_time.isoformat(),
-                        "reason": retry_info['reason']
-                    }
-                )
+        # With a Content-Length, UploadSizeLimitMiddleware already checked queue capacity before the body was read
+        declared_size = declared_body_size(request)
         
         # Generate job ID
         job_id = generate_job_id()
         
-        # Save uploaded file to disk (NOT in memory)
+        # The multipart body is already spooled (to a tempfile past 1 MB) by the time we get here,
+        # so copy it to disk in one worker-thread hop instead of one hop per chunk.
         upload_path = os.path.join(config.UPLOAD_DIR, f"{job_id}.pdf")
-        with open(upload_path, "wb") as buffer:
-            buffer.write(content)
-        
-        del content  # Free memory immediately
-        
-        # Validate PDF structure
-        pdf_validation = validate_pdf_structure(upload_path)
-        if not pdf_validation.is_valid:
-            os.remove(upload_path)  # Clean up
-            raise HTTPException(status_code=400, detail=pdf_validation.message)
-        
-        # Add to queue
-        print(f"➕ [QUEUE] Adding job {job_id} to queue")
-        queue_manager.add_job(
-            job_id=job_id,
-            session_id=session,
-            file_path=upload_path,
-            file_size=file_size,
-            chunk_size=chunk_size
+        logger.debug("📖 [UPLOAD] Streaming file to disk...")
+        sniffer = PDFStreamSniffer()
+        if file.size is not None and file.size > config.ABSOLUTE_MAX_FILE_SIZE:
+            file_size = file.size
+        else:
+            try:
+                file_size = await asyncio.to_thread(copy_upload_to_disk, file.file, upload_path, sniffer)
+            except Exception:
+                # Don't leave a partial upload behind (nothing in the queue references it)
+                if os.path.exists(upload_path):
+                    os.remove(upload_path)
+                raise
+        
+        if file_size > config.ABSOLUTE_MAX_FILE_SIZE:
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum allowed: {format_bytes(config.ABSOLUTE_MAX_FILE_SIZE)}"
+            )
+        logger.debug("📖 [UPLOAD] File write complete. Size: %d bytes", file_size)
+        
+        # Validation (PDF parse) and queue persistence block, so run them off the event loop
+        return await asyncio.to_thread(
+            enqueue_uploaded_file,
+            session, job_id, upload_path, file_size, chunk_size, sniffer,
+            capacity_checked=declared_size is not None
         )
         
-        # Create status tracking
-        print(f"📝 [STATUS] Creating job {job_id} with status 'queued'")
-        status_manager.create_job(job_id, "Queued for processing")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+
+@app.post("/api/upload-stream", response_model=UploadResponse)
+async def upload_pdf_stream(
+    request: Request,
+    response: Response,
+    x_filename: str = Header(...),
+    x_chunk_size: int = Header(default=config.DEFAULT_CHUNK_SIZE),
+    session_id: Optional[str] = Cookie(default=None)
+):
+    """
+    Upload PDF file as the raw request body (no multipart encoding).
+    The body is written to disk as it arrives, so nothing is spooled to a
+    temporary file first. Filename and chunk size are sent as headers.
+    
+    Args:
+        request: Raw request (body is the PDF bytes)
+        x_filename: Original filename (X-Filename header)
+        x_chunk_size: Number of pages per chunk (X-Chunk-Size header)
+        session_id: User session (cookie)
+        
+    Returns:
+        UploadResponse with job_id, 413 if too large, or 503 if server busy
+    """
+    logger.debug("📤 [UPLOAD] Received stream upload request for file: %s", x_filename)
+    try:
+        session = get_or_create_session(session_id)
+        response.set_cookie(key="session_id", value=session, httponly=True, max_age=86400)
+        
+        if not is_allowed_file(x_filename):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid file type. Only PDF files are allowed."
+            )
+        
+        if x_chunk_size <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Chunk size must be greater than 0"
+            )
+        
+        declared_size = declared_body_size(request)  # Capacity already checked by UploadSizeLimitMiddleware
+        
+        job_id = generate_job_id()
+        upload_path = os.path.join(config.UPLOAD_DIR, f"{job_id}.pdf")
+        
+        # Write body chunks as they arrive (off the event loop), aborting once the size limit is crossed
+        file_size = 0
+        sniffer = PDFStreamSniffer()
+        try:
+            async with anyio.wrap_file(await anyio.to_thread.run_sync(open_for_write, upload_path)) as buffer:
+                async for chunk in request.stream():
+                    file_size += len(chunk)
+                    if file_size > config.ABSOLUTE_MAX_FILE_SIZE:
+                        break
+                    sniffer.feed(chunk)
+                    await buffer.write(chunk)
+        except Exception:
+            # Client disconnected or write failed - don't leave a partial upload behind
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+            raise
         
-        return UploadResponse(
-            job_id=job_id,
-            message="File uploaded successfully. Added to processing queue."
+        if file_size > config.ABSOLUTE_MAX_FILE_SIZE:
+            os.remove(upload_path)
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum allowed: {format_bytes(config.ABSOLUTE_MAX_FILE_SIZE)}"
+            )
+        logger.debug("📖 [UPLOAD] Stream write complete. Size: %d bytes", file_size)
+        
+        # Validation (PDF parse) and queue persistence block, so run them off the event loop
+        return await asyncio.to_thread(
+            enqueue_uploaded_file,
+            session, job_id, upload_path, file_size, x_chunk_size, sniffer,
+            capacity_checked=declared_size is not None
         )
         
     except HTTPException:
@@ -447,11 +801,29 @@ async def upload_pdf(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+def poll_interval_hint(updated_at: datetime) -> int:
+    """
+    Suggest how long a client should wait before polling again.
+    Grows by one second per 10 seconds without a change, between the configured bounds.
+    
+    Args:
+        updated_at: Time of the last status change
+        
+    Returns:
+        Poll interval in seconds
+    """
+    unchanged_seconds = (datetime.now() - updated_at).total_seconds()
+    interval = config.STATUS_POLL_MIN_INTERVAL + int(unchanged_seconds // 10)
+    return min(interval, config.STATUS_POLL_MAX_INTERVAL)
+
+
+# Plain def too - the most polled endpoint mustn't stall the event loop on a Redis round trip
 @app.get("/api/status/{job_id}", response_model=StatusResponse)
-async def get_job_status(job_id: str):
+def get_job_status(job_id: str, request: Request):
     """
     Get current status of a processing job.
     Shows queue position if queued, processing status if active.
+    Processing statuses carry an ETag; a matching If-None-Match gets 304 Not Modified.
     
     Args:
         job_id: Job identifier
@@ -460,48 +832,62 @@ async def get_job_status(job_id: str):
         StatusResponse with current job status and queue info
     """
     try:
-        # Check queue first
-        queue_job = queue_manager.get_job(job_id)
+        # Malformed IDs can't exist - skip the manager lookups
+        if not is_valid_job_id(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
         
-        if queue_job:
+        # Check queue first (job, position and wait estimate in a single lookup)
+        queue_snapshot = queue_manager.get_job_snapshot(job_id)
+        
+        if queue_snapshot:
+            queue_job, position, wait_seconds = queue_snapshot
             if queue_job['status'] == 'queued':
                 # Job is waiting in queue
-                position = queue_manager.get_queue_position(job_id)
-                wait_seconds = queue_manager.estimate_wait_time(job_id)
                 start_time = datetime.now() + timedelta(seconds=wait_seconds)
                 
-                return StatusResponse(
-                    job_id=job_id,
-                    status="queued",
-                    progress=0,
-                    message=f"Your job is queued. {position - 1} job(s) in queue.",
-                    queue_position=position,
-                    jobs_ahead=position - 1,
-                    estimated_wait_seconds=wait_seconds,
-                    estimated_start_time=start_time.isoformat()
+                # Server-built values - encode directly rather than validating a StatusResponse
+                return Response(
+                    content=orjson.dumps({
+                        "job_id": job_id,
+                        "status": "queued",
+                        "progress": 0,
+                        "message": f"Your job is queued. {position - 1} job(s) in queue.",
+                        "result_path": None,
+                        "error": None,
+                        "version": None,
+                        "queue_position": position,
+                        "jobs_ahead": position - 1,
+                        "estimated_wait_seconds": wait_seconds,
+                        "estimated_start_time": start_time
+                    }),
+                    media_type="application/json"
                 )
             
             elif queue_job['status'] == 'finished':
                 # Check if download window expired
-                if queue_job.get('download_window_expires'):
-                    expires = datetime.fromisoformat(queue_job['download_window_expires'])
-                    if datetime.now() > expires:
-                        raise HTTPException(
-                            status_code=410,
-                            detail="Download window expired (1 minute limit). Please resubmit your file."
-                        )
-        
-        # Check processing status
-        status = status_manager.get_status(job_id)
+                if queue_manager.is_download_expired(queue_job):
+                    raise HTTPException(
+                        status_code=410,
+                        detail="Download window expired (1 minute limit). Please resubmit your file."
+                    )
         
-        if status is None:
+        # Check processing status (body is cached until the status changes)
+        snapshot = status_manager.get_status_json(job_id)
+        
+        if snapshot is None:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        response_data = status.to_dict()
-        response_data['queue_position'] = 0
-        response_data['jobs_ahead'] = 0
+        version, updated_at, body = snapshot
+        headers = {
+            "ETag": f'W/"{job_id}-{version}"',
+            "Cache-Control": "max-age=1",
+            "X-Poll-Interval": str(poll_interval_hint(updated_at))
+        }
+        
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
         
-        return StatusResponse(**response_data)
+        return Response(content=body, media_type="application/json", headers=headers)
         
     except HTTPException:
         raise
@@ -509,8 +895,20 @@ async def get_job_status(job_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting status: {str(e)}")
 
 
+def finish_download(job_id: str):
+    """
+    Bookkeeping after a result PDF has been sent to the client.
+    
+    Args:
+        job_id: Job identifier
+    """
+    queue_manager.mark_downloaded(job_id)
+    status_manager.delete_job(job_id)
+
+
+# Handlers doing blocking file/system calls are plain defs so Starlette runs them in its threadpool
 @app.get("/api/download/{job_id}")
-async def download_pdf(job_id: str):
+def download_pdf(job_id: str):
     """
     Download processed PDF file.
     File is deleted immediately after successful response (200 OK).
@@ -523,18 +921,19 @@ async def download_pdf(job_id: str):
         FileResponse with processed PDF
     """
     try:
+        if not is_valid_job_id(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        
         # Check queue status
         queue_job = queue_manager.get_job(job_id)
         
         if queue_job:
             # Check if download window expired
-            if queue_job.get('download_window_expires'):
-                expires = datetime.fromisoformat(queue_job['download_window_expires'])
-                if datetime.now() > expires:
-                    raise HTTPException(
-                        status_code=410,
-                        detail="Download window expired (1 minute limit). File has been deleted. Please resubmit."
-                    )
+            if queue_manager.is_download_expired(queue_job):
+                raise HTTPException(
+                    status_code=410,
+                    detail="Download window expired (1 minute limit). File has been deleted. Please resubmit."
+                )
         
         # Check job status
         status = status_manager.get_status(job_id)
@@ -548,23 +947,38 @@ async def download_pdf(job_id: str):
                 detail=f"Job not ready. Current status: {status.status}"
             )
         
-        if not status.result_path or not os.path.exists(status.result_path):
+        try:
+            # One stat serves both the existence check and Content-Length
+            stat_result = os.stat(status.result_path) if status.result_path else None
+        except FileNotFoundError:
+            stat_result = None
+        
+        if stat_result is None:
             raise HTTPException(status_code=404, detail="Result file not found. May have been deleted.")
         
-        # Create response
-        response = FileResponse(
+        if config.DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+            # Reverse proxy (nginx) sends the file from its internal location, after this
+            # response is complete - so nothing is marked downloaded here, or the file could
+            # be deleted before nginx opens it. The download window's expiry removes it.
+            accel_path = f"{config.DOWNLOAD_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{os.path.basename(status.result_path)}"
+            return Response(
+                media_type="application/pdf",
+                headers={
+                    "X-Accel-Redirect": accel_path,
+                    "Content-Disposition": f'attachment; filename="watermarked_{job_id}.pdf"'
+                }
+            )
+        
+        # Mark as downloaded only once the body has been sent
+        # (the file itself is then deleted by the queue's cleanup thread)
+        return PDFFileResponse(
             path=status.result_path,
             media_type="application/pdf",
-            filename=f"watermarked_{job_id}.pdf"
+            filename=f"watermarked_{job_id}.pdf",
+            stat_result=stat_result,
+            background=BackgroundTask(finish_download, job_id)
         )
         
-        # Mark as downloaded and schedule immediate cleanup
-        # File will be deleted by background cleanup thread
-        queue_manager.mark_downloaded(job_id)
-        status_manager.delete_job(job_id)
-        
-        return response
-        
     except HTTPException:
         raise
     except Exception as e:
@@ -572,7 +986,7 @@ async def download_pdf(job_id: str):
 
 
 @app.delete("/api/cleanup/{job_id}")
-async def cleanup_job(job_id: str):
+def cleanup_job(job_id: str):
     """
     Clean up job files and remove from tracking.
     
@@ -583,6 +997,9 @@ async def cleanup_job(job_id: str):
         Success message
     """
     try:
+        if not is_valid_job_id(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        
         # Check if job exists in either manager
         exists_in_status = status_manager.job_exists(job_id)
         exists_in_queue = queue_manager.get_job(job_id) is not None
@@ -609,23 +1026,37 @@ async def cleanup_job(job_id: str):
 
 # Admin/Debug endpoints (optional)
 @app.get("/api/admin/jobs")
-async def list_all_jobs():
+def list_all_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    status: Optional[str] = None
+):
     """
-    List all jobs (for debugging/admin).
+    List jobs (for debugging/admin), one page at a time.
+    The body is streamed, one pre-encoded job at a time.
     
+    Args:
+        limit: Maximum number of jobs to return
+        offset: Number of jobs to skip
+        status: Only list jobs with this status
+        
     Returns:
-        Dictionary of all jobs
+        Streamed JSON with job counts and the requested page of jobs
     """
-    jobs = status_manager.get_all_jobs()
-    return {
-        "total_jobs": len(jobs),
-        "active_jobs": status_manager.count_active_jobs(),
-        "jobs": {job_id: status.to_dict() for job_id, status in jobs.items()}
-    }
+    total, page = status_manager.get_jobs_page(limit, offset, status)
+    active = status_manager.count_active_jobs()
+    
+    def generate():
+        yield b'{"total_jobs":%d,"active_jobs":%d,"limit":%d,"offset":%d,"jobs":{' % (total, active, limit, offset)
+        for i, job in enumerate(page):
+            yield (b',' if i else b'') + orjson.dumps(job.job_id) + b':' + job.to_json()
+        yield b'}}'
+    
+    return StreamingResponse(generate(), media_type="application/json")
 
 
 @app.post("/api/admin/cleanup-old")
-async def cleanup_old_jobs():
+def cleanup_old_jobs():
     """
     Clean up jobs older than configured retention time.
     
@@ -644,5 +1075,8 @@ if __name__ == "__main__":
         "app:app",
         host=config.HOST,
         port=config.PORT,
-        reload=config.DEBUG
+        reload=config.DEBUG,
+        loop="uvloop",
+        http="httptools",
+        workers=1 if config.DEBUG else config.WEB_WORKERS
     )
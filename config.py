@@ -2,12 +2,17 @@
 Configuration settings for WaterMarks Backend
 """
 import os
-from typing import List
+from typing import Tuple
+from dotenv import load_dotenv
+
+# Load .env before any setting below is read (each is resolved once, at import)
+load_dotenv()
 
 # Server Configuration
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 8000))
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", 1))  # Uvicorn worker processes (job queue and statuses are per-process, keep at 1)
 
 # File Size Limits
 RAM_SAFETY_MARGIN = float(os.getenv("RAM_SAFETY_MARGIN", "0.7"))  # Use 70% of available RAM as max
@@ -15,18 +20,38 @@ ABSOLUTE_MAX_FILE_SIZE = int(os.getenv("ABSOLUTE_MAX_FILE_SIZE", 5 * 1024 * 1024
 MIN_FREE_RAM_REQUIRED = int(os.getenv("MIN_FREE_RAM_REQUIRED", 100 * 1024 * 1024))  # Keep 100MB free
 CONTAINER_RAM_LIMIT = int(os.getenv("CONTAINER_RAM_LIMIT", 0))  # Fallback if cgroup unreadable (0 = auto-detect from cgroup)
 
+# Upload streaming: bytes read from the request per iteration (1MB keeps peak RAM per upload bounded)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Slack allowed for multipart framing when checking an upload's Content-Length against the size limit
+MULTIPART_OVERHEAD_ALLOWANCE = int(os.getenv("MULTIPART_OVERHEAD_ALLOWANCE", 64 * 1024))
+
+# Download streaming: bytes sent per read of the result file (Starlette default is 64KB)
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+# Behind nginx: internal location mapped to OUTPUT_DIR (e.g. /_internal/outputs). Empty = app sends the file
+DOWNLOAD_ACCEL_REDIRECT_PREFIX = os.getenv("DOWNLOAD_ACCEL_REDIRECT_PREFIX", "")
+
 # Size Re-check on Upload
 RECHECK_SIZE_ON_UPLOAD = os.getenv("RECHECK_SIZE_ON_UPLOAD", "True").lower() == "true"
 
 # Processing Configuration
 MAX_PARALLEL_WORKERS = int(os.getenv("MAX_PARALLEL_WORKERS", 4))  # Max concurrent watermark operations
+IN_MEMORY_CHUNKS_MAX_FILE_SIZE = int(os.getenv("IN_MEMORY_CHUNKS_MAX_FILE_SIZE", 32 * 1024 * 1024))  # Keep watermarked chunks in RAM (not temp files) for inputs up to this size
+CHUNK_PROCESS_MIN_CHUNKS = int(os.getenv("CHUNK_PROCESS_MIN_CHUNKS", 4))  # Watermark chunks in worker processes from this many chunks (threads below)
 DEFAULT_CHUNK_SIZE = int(os.getenv("DEFAULT_CHUNK_SIZE", 10))  # Default pages per chunk
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", os.cpu_count() or 1))  # Worker processes for running jobs (RAM checks still gate admission)
 
 # Concurrent Processing Resource Estimation
 RAM_USAGE_MULTIPLIER = float(os.getenv("RAM_USAGE_MULTIPLIER", "8.0"))  # Estimate 8x file size for RAM usage (accounts for merging phase spike)
 DISK_USAGE_MULTIPLIER = float(os.getenv("DISK_USAGE_MULTIPLIER", "2.0"))  # Estimate 2x file size for disk usage
 MIN_RAM_BUFFER = int(os.getenv("MIN_RAM_BUFFER", 100 * 1024 * 1024))  # Keep 100MB RAM buffer for concurrent jobs
 MIN_DISK_BUFFER = int(os.getenv("MIN_DISK_BUFFER", 150 * 1024 * 1024))  # Keep 150MB disk buffer
+PER_JOB_RAM_ESTIMATE = int(os.getenv("PER_JOB_RAM_ESTIMATE", int(ABSOLUTE_MAX_FILE_SIZE * RAM_USAGE_MULTIPLIER)))  # Worst-case RAM per running job (caps worker slots)
+QUEUE_RECHECK_SECONDS = float(os.getenv("QUEUE_RECHECK_SECONDS", "2"))  # Re-check resources for waiting jobs this often
+QUEUE_FLUSH_DELAY = float(os.getenv("QUEUE_FLUSH_DELAY", "0.2"))  # Seconds to coalesce queue changes before writing queue.json.wal
+QUEUE_WAL_MAX_BYTES = int(os.getenv("QUEUE_WAL_MAX_BYTES", 1024 * 1024))  # Rewrite queue.json and truncate its WAL past this size
+QUEUE_SYNC_EVERY = int(os.getenv("QUEUE_SYNC_EVERY", "10"))  # fdatasync the queue WAL every N appends
+QUEUE_IDLE_WAIT_SECONDS = float(os.getenv("QUEUE_IDLE_WAIT_SECONDS", "30"))  # Safety re-check while the queue is empty
 
 # Watermark Configuration
 WATERMARK_TEXT = os.getenv("WATERMARK_TEXT", "WATERMARK")
@@ -34,17 +59,17 @@ WATERMARK_FONT_SIZE = int(os.getenv("WATERMARK_FONT_SIZE", 60))
 WATERMARK_OPACITY = float(os.getenv("WATERMARK_OPACITY", "0.3"))  # 0.0 to 1.0
 WATERMARK_ROTATION = int(os.getenv("WATERMARK_ROTATION", 45))  # Degrees
 
-# Color palette for chunks (will rotate through these)
-WATERMARK_COLORS: List[tuple] = [
-    (1, 0, 0),      # Red
-    (0, 0, 1),      # Blue
-    (0, 0.5, 0),    # Green
-    (1, 0.5, 0),    # Orange
-    (0.5, 0, 0.5),  # Purple
-    (0, 0.8, 0.8),  # Cyan
-    (1, 0, 1),      # Magenta
-    (0.6, 0.4, 0.2) # Brown
-]
+# Color palette for chunks (will rotate through these). Immutable, floats up front.
+WATERMARK_COLORS: Tuple[Tuple[float, float, float], ...] = (
+    (1.0, 0.0, 0.0),  # Red
+    (0.0, 0.0, 1.0),  # Blue
+    (0.0, 0.5, 0.0),  # Green
+    (1.0, 0.5, 0.0),  # Orange
+    (0.5, 0.0, 0.5),  # Purple
+    (0.0, 0.8, 0.8),  # Cyan
+    (1.0, 0.0, 1.0),  # Magenta
+    (0.6, 0.4, 0.2)   # Brown
+)
 
 # File Storage
 TEMP_DIR = os.getenv("TEMP_DIR", "temp_files")
@@ -52,12 +77,44 @@ UPLOAD_DIR = os.path.join(TEMP_DIR, "uploads")
 PROCESSING_DIR = os.path.join(TEMP_DIR, "processing")
 OUTPUT_DIR = os.path.join(TEMP_DIR, "outputs")
 
+# System Info
+SYSINFO_CACHE_SECONDS = float(os.getenv("SYSINFO_CACHE_SECONDS", "0.5"))  # Max age of cached memory stats (health, size and admission checks)
+
+# Response Compression
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 500))  # Only gzip responses at least this many bytes
+
+# Status Polling
+STATUS_POLL_MIN_INTERVAL = int(os.getenv("STATUS_POLL_MIN_INTERVAL", 1))  # Suggested poll interval (seconds) right after a change
+STATUS_POLL_MAX_INTERVAL = int(os.getenv("STATUS_POLL_MAX_INTERVAL", 10))  # Upper bound while the status stays unchanged
+
+# Shared Status Store (optional, lets several server processes share job statuses)
+REDIS_URL = os.getenv("REDIS_URL", "")  # e.g. redis://localhost:6379/0 (empty = in-memory)
+
 # Job Management
 JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "1"))  # Clean up jobs after 1 hour
 MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "10"))
+STATUS_CLEANUP_INTERVAL = int(os.getenv("STATUS_CLEANUP_INTERVAL", "600"))  # Seconds between automatic old-status sweeps
 
 # CORS Configuration (for frontend)
-CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173,https://*.github.io").split(",")
+CORS_ORIGINS = tuple(
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173,https://*.github.io").split(",")
+    if origin.strip()
+)
+
+# Local dev origins. Cannot use allow_origins=["*"] with allow_credentials=True (CORS spec violation),
+# so localhost origins are listed explicitly
+DEV_CORS_ORIGINS = (
+    "http://localhost:3000",
+    "http://localhost:5173",
+    "http://localhost:5174",
+    "http://127.0.0.1:3000",
+    "http://127.0.0.1:5173",
+    "http://127.0.0.1:5174",
+)
+
+# Origins actually passed to the CORS middleware
+ALLOWED_CORS_ORIGINS = DEV_CORS_ORIGINS if DEBUG else CORS_ORIGINS
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = [".pdf"]
+ALLOWED_EXTENSIONS = frozenset({".pdf"})
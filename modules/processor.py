@@ -1,13 +1,24 @@
 """
-Processor Module - Handles PDF splitting, merging, and orchestration
+Processor Module - Handles PDF chunking, merging, and orchestration
 """
 import os
-from typing import List, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+from io import BytesIO
+from typing import List
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from dataclasses import dataclass
-from PyPDF2 import PdfReader, PdfWriter, PdfMerger
+from PyPDF2 import PdfReader, PdfWriter
 import config
-from modules.watermark import add_watermark_to_pdf, get_color_for_chunk
+from utils.logger import get_logger
+from modules.watermark import watermark_page_range, get_color_for_chunk
+
+logger = get_logger("watermarks.processor")
+
+
+# Chunk workers are started from a forkserver: the job process calling us has a
+# progress-queue feeder thread, and forking a threaded process isn't safe.
+_chunk_mp_context = multiprocessing.get_context("forkserver")
 
 
 @dataclass
@@ -17,108 +28,49 @@ class ChunkInfo:
     start_page: int
     end_page: int
     order: int
-    input_path: str
+    input_path: str  # Source PDF; start_page/end_page select the chunk's pages
     output_path: str = None
     color: tuple = None
     status: str = "pending"  # pending, processing, completed, error
     error: str = None
+    output_bytes: bytes = None  # Watermarked PDF when processed in memory (output_path is then None)
 
 
-def split_pdf_into_chunks(
-    pdf_path: str,
-    chunk_size: int,
-    output_dir: str,
-    status_callback=None
-) -> List[ChunkInfo]:
+def plan_chunks(pdf_path: str, total_pages: int, chunk_size: int) -> List[ChunkInfo]:
     """
-    Split PDF into chunks based on chunk size.
+    Divide a PDF into chunks by page range, without writing chunk files.
+    Workers read their pages straight from the source PDF.
     
     Args:
         pdf_path: Path to input PDF
+        total_pages: Number of pages in the PDF
         chunk_size: Maximum pages per chunk
-        output_dir: Directory to save chunk files
-        status_callback: Optional callback for progress updates (status, progress)
         
     Returns:
-        List of ChunkInfo objects with metadata
-        
-    Raises:
-        Exception if splitting fails
+        List of ChunkInfo objects
     """
-    try:
-        # Read PDF
-        reader = PdfReader(pdf_path)
-        total_pages = len(reader.pages)
-        
-        # Calculate actual chunk size (minimum of requested and total pages)
-        actual_chunk_size = min(chunk_size, total_pages)
-        
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
-        
-        chunks = []
-        chunk_id = 0
-        
-        # Calculate how many chunks we'll have
-        total_chunks = (total_pages + actual_chunk_size - 1) // actual_chunk_size
-        
-        # Split into chunks (progress: 1-30%)
-        for start_page in range(0, total_pages, actual_chunk_size):
-            end_page = min(start_page + actual_chunk_size, total_pages)
-            
-            # Report progress at chunk start (sub-progress: 0%)
-            if status_callback and total_chunks > 1:
-                progress = 1 + int(chunk_id / total_chunks * 29 * 0.33)  # Start of chunk
-                status_callback("splitting", progress=progress)
-            
-            # Create chunk file
-            chunk_filename = f"chunk_{chunk_id:04d}.pdf"
-            chunk_path = os.path.join(output_dir, chunk_filename)
-            
-            # Write chunk to file
-            writer = PdfWriter()
-            for page_num in range(start_page, end_page):
-                writer.add_page(reader.pages[page_num])
-            
-            # Report progress at chunk middle (sub-progress: 50%)
-            if status_callback and total_chunks > 1:
-                progress = 1 + int((chunk_id + 0.5) / total_chunks * 29)  # Middle of chunk
-                status_callback("splitting", progress=progress)
-            
-            with open(chunk_path, 'wb') as output_file:
-                writer.write(output_file)
-            
-            # Create chunk info
-            chunk = ChunkInfo(
-                chunk_id=chunk_id,
-                start_page=start_page,
-                end_page=end_page,
-                order=chunk_id,
-                input_path=chunk_path,
-                color=get_color_for_chunk(chunk_id)
-            )
-            chunks.append(chunk)
-            
-            # Report progress at chunk end (sub-progress: 100%)
-            if status_callback:
-                progress = 1 + int((chunk_id + 1) / total_chunks * 29)  # End of chunk
-                status_callback("splitting", progress=progress)
-            
-            chunk_id += 1
-        
-        return chunks
-        
-    except Exception as e:
-        raise Exception(f"Failed to split PDF into chunks: {str(e)}")
+    actual_chunk_size = max(1, min(chunk_size, total_pages))
+    return [
+        ChunkInfo(
+            chunk_id=chunk_id,
+            start_page=start_page,
+            end_page=min(start_page + actual_chunk_size, total_pages),
+            order=chunk_id,
+            input_path=pdf_path,
+            color=get_color_for_chunk(chunk_id)
+        )
+        for chunk_id, start_page in enumerate(range(0, total_pages, actual_chunk_size))
+    ]
 
 
-def process_single_chunk(chunk: ChunkInfo, output_dir: str) -> ChunkInfo:
+def process_single_chunk(chunk: ChunkInfo, output_dir: str = None) -> ChunkInfo:
     """
     Process a single chunk by adding watermark.
     
     Args:
         chunk: ChunkInfo object
-        output_dir: Directory to save watermarked chunk
+        output_dir: Directory to save watermarked chunk, or None to keep it
+            in memory (chunk.output_bytes)
         
     Returns:
         Updated ChunkInfo object
@@ -127,17 +79,26 @@ def process_single_chunk(chunk: ChunkInfo, output_dir: str) -> ChunkInfo:
         chunk.status = "processing"
         
         # Create output path
-        watermarked_filename = f"watermarked_chunk_{chunk.chunk_id:04d}.pdf"
-        output_path = os.path.join(output_dir, watermarked_filename)
-        
-        # Add watermark
-        add_watermark_to_pdf(
-            input_pdf_path=chunk.input_path,
-            output_pdf_path=output_path,
-            color=chunk.color
-        )
+        if output_dir is None:
+            output_path = BytesIO()
+        else:
+            watermarked_filename = f"watermarked_chunk_{chunk.chunk_id:04d}.pdf"
+            output_path = os.path.join(output_dir, watermarked_filename)
+        
+        # Add watermark (open by handle so only the xref and this chunk's pages are read)
+        with open(chunk.input_path, 'rb') as source_file:
+            watermark_page_range(
+                PdfReader(source_file),
+                chunk.start_page,
+                chunk.end_page,
+                output_pdf_path=output_path,
+                color=chunk.color
+            )
         
-        chunk.output_path = output_path
+        if output_dir is None:
+            chunk.output_bytes = output_path.getvalue()
+        else:
+            chunk.output_path = output_path
         chunk.status = "completed"
         
         return chunk
@@ -148,123 +109,55 @@ def process_single_chunk(chunk: ChunkInfo, output_dir: str) -> ChunkInfo:
         return chunk
 
 
-def parallel_watermark_chunks(
-    chunks: List[ChunkInfo],
-    output_dir: str,
-    max_workers: int = None,
-    status_callback=None
-) -> List[ChunkInfo]:
-    """
-    Process multiple chunks in parallel, adding watermarks.
-    
-    Args:
-        chunks: List of ChunkInfo objects
-        output_dir: Directory to save watermarked chunks
-        max_workers: Maximum number of parallel workers
-        status_callback: Optional callback for progress updates (status, progress)
-        
-    Returns:
-        List of processed ChunkInfo objects
-        
-    Raises:
-        Exception if any chunk fails to process
-    """
-    try:
-        if max_workers is None:
-            max_workers = config.MAX_PARALLEL_WORKERS
-        
-        # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Process chunks in parallel
-        processed_chunks = []
-        total_chunks = len(chunks)
-        completed_count = 0
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all chunks for processing
-            future_to_chunk = {
-                executor.submit(process_single_chunk, chunk, output_dir): chunk
-                for chunk in chunks
-            }
-            
-            # Collect results as they complete (progress: 31-79%)
-            for future in as_completed(future_to_chunk):
-                chunk = future_to_chunk[future]
-                try:
-                    processed_chunk = future.result()
-                    processed_chunks.append(processed_chunk)
-                    completed_count += 1
-                    
-                    # Report progress after each chunk completes
-                    if status_callback:
-                        progress = 31 + int(completed_count / total_chunks * 48)  # 31-79%
-                        status_callback("adding_watermarks", progress=progress)
-                    
-                    # Check for errors
-                    if processed_chunk.status == "error":
-                        raise Exception(
-                            f"Chunk {processed_chunk.chunk_id} failed: {processed_chunk.error}"
-                        )
-                except Exception as e:
-                    raise Exception(f"Error processing chunk {chunk.chunk_id}: {str(e)}")
-        
-        # Sort by order to maintain sequence
-        processed_chunks.sort(key=lambda x: x.order)
-        
-        return processed_chunks
-        
-    except Exception as e:
-        raise Exception(f"Failed to process chunks in parallel: {str(e)}")
+def _chunk_worker_count(max_workers: int, chunk_count: int) -> int:
+    """Cap watermark workers by chunk count and cores (more would only contend)"""
+    if max_workers is None:
+        max_workers = config.MAX_PARALLEL_WORKERS
+    workers = max(1, min(max_workers, chunk_count, os.cpu_count() or 1, 16))
+    if workers < max_workers:
+        logger.debug("Capped chunk workers %d -> %d (%d chunks, %s cores)",
+                     max_workers, workers, chunk_count, os.cpu_count())
+    return workers
+
 
+def _map_chunksize(chunk_count: int, max_workers: int) -> int:
+    """Chunks handed to a pool worker per round trip (about 4 batches per worker)"""
+    return max(1, chunk_count // (max_workers * 4))
 
-def merge_chunks(chunk_paths: List[str], output_path: str, status_callback=None) -> str:
+
+def _make_chunk_executor(max_workers: int, chunk_count: int) -> Executor:
     """
-    Merge watermarked chunks back into a single PDF.
+    Pick the executor for watermarking chunks.
+    Watermarking is CPU-bound and holds the GIL, so real parallelism needs processes;
+    for a handful of chunks (or a single worker) process startup costs more than it saves.
     
     Args:
-        chunk_paths: List of paths to watermarked chunk PDFs (in order)
-        output_path: Path to save merged PDF
-        status_callback: Optional callback for progress updates
+        max_workers: Worker count (already capped)
+        chunk_count: Number of chunks to process
         
     Returns:
-        Path to merged PDF
-        
-    Raises:
-        Exception if merging fails
+        ProcessPoolExecutor or ThreadPoolExecutor
     """
-    try:
-        merger = PdfMerger()
-        total_chunks = len(chunk_paths)
-        
-        # Add each chunk in order with progress reporting
-        for i, chunk_path in enumerate(chunk_paths):
-            if not os.path.exists(chunk_path):
-                raise Exception(f"Chunk file not found: {chunk_path}")
-            merger.append(chunk_path)
-            
-            # Report progress: 80% (start of merge) to 95% (end of merge)
-            if status_callback and total_chunks > 1:
-                progress = 80 + int((i + 1) / total_chunks * 15)  # 80-95%
-                status_callback("merging", progress=progress)
-        
-        # Write merged PDF (final 5% of progress)
-        if status_callback:
-            status_callback("merging", progress=95)
-            
-        with open(output_path, 'wb') as output_file:
-            merger.write(output_file)
-        
-        merger.close()
-        
-        # Final merge complete
-        if status_callback:
-            status_callback("merging", progress=100)
-        
-        return output_path
-        
-    except Exception as e:
-        raise Exception(f"Failed to merge chunks: {str(e)}")
+    if max_workers > 1 and chunk_count >= config.CHUNK_PROCESS_MIN_CHUNKS:
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=_chunk_mp_context)
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def _append_chunk(writer: PdfWriter, chunk_path: str):
+    """Clone a chunk file's pages onto the end of writer (the chunk's reader is released right after)"""
+    if not os.path.exists(chunk_path):
+        raise Exception(f"Chunk file not found: {chunk_path}")
+    with open(chunk_path, 'rb') as chunk_file:
+        writer.append(PdfReader(chunk_file), import_outline=False)
+
+
+def _append_processed_chunk(writer: PdfWriter, chunk: ChunkInfo):
+    """Append a watermarked chunk, whether it was kept in memory or written to disk"""
+    if chunk.output_bytes is not None:
+        writer.append(PdfReader(BytesIO(chunk.output_bytes)), import_outline=False)
+        chunk.output_bytes = None  # Release the buffer as soon as its pages are cloned
+    else:
+        _append_chunk(writer, chunk.output_path)
 
 
 def process_pdf_with_watermarks(
@@ -275,6 +168,9 @@ def process_pdf_with_watermarks(
 ) -> str:
     """
     Complete workflow: split PDF, add watermarks in parallel, merge back.
+    Chunks are page ranges of the input, not separate files: each worker reads its
+    pages straight from the source PDF, and watermarked chunks are merged in order
+    as soon as they are ready.
     
     Args:
         input_pdf_path: Path to input PDF
@@ -291,37 +187,63 @@ def process_pdf_with_watermarks(
     try:
         # Create working directories
         job_dir = os.path.join(config.PROCESSING_DIR, job_id)
-        chunks_dir = os.path.join(job_dir, "chunks")
         watermarked_dir = os.path.join(job_dir, "watermarked")
         
-        os.makedirs(chunks_dir, exist_ok=True)
         os.makedirs(watermarked_dir, exist_ok=True)
         os.makedirs(config.OUTPUT_DIR, exist_ok=True)
         
-        # Step 1: Split into chunks (progress: 1-30%)
+        # Step 1: Divide into page ranges (progress: 1-30%)
         if status_callback:
             status_callback("splitting", progress=1)
         
-        chunks = split_pdf_into_chunks(input_pdf_path, chunk_size, chunks_dir, status_callback=status_callback)
+        with open(input_pdf_path, 'rb') as input_file:
+            total_pages = len(PdfReader(input_file).pages)
+        chunks = plan_chunks(input_pdf_path, total_pages, chunk_size)
+        total_chunks = len(chunks)
+        max_workers = _chunk_worker_count(None, total_chunks)
         
-        # Step 2: Add watermarks in parallel (progress: 31-79%)
         if status_callback:
-            status_callback("adding_watermarks", progress=31)
+            status_callback("splitting", progress=30)
         
-        processed_chunks = parallel_watermark_chunks(chunks, watermarked_dir, status_callback=status_callback)
+        # Small jobs keep watermarked chunks in memory instead of a disk round trip
+        chunk_output_dir = None if os.path.getsize(input_pdf_path) <= config.IN_MEMORY_CHUNKS_MAX_FILE_SIZE else watermarked_dir
         
-        # Step 3: Merge chunks
+        with _make_chunk_executor(max_workers, total_chunks) as executor:
+            # map batches chunks per worker round trip and yields results in chunk order
+            results = executor.map(
+                partial(process_single_chunk, output_dir=chunk_output_dir),
+                chunks,
+                chunksize=_map_chunksize(total_chunks, max_workers)
+            )
+            
+            # Step 2: Merge watermarked chunks in order as they complete (progress: 31-79%)
+            if status_callback:
+                status_callback("adding_watermarks", progress=31)
+            
+            writer = PdfWriter()
+            for completed_count, processed_chunk in enumerate(results, start=1):
+                if processed_chunk.status == "error":
+                    raise Exception(
+                        f"Chunk {processed_chunk.chunk_id} failed: {processed_chunk.error}"
+                    )
+                _append_processed_chunk(writer, processed_chunk)
+                
+                if status_callback:
+                    progress = 31 + int(completed_count / total_chunks * 48)  # 31-79%
+                    status_callback("adding_watermarks", progress=progress)
+        
+        # Step 3: Write the merged PDF (progress: 80-100%)
         if status_callback:
             status_callback("merging", progress=80)
         
-        # Get watermarked chunk paths in order
-        chunk_paths = [chunk.output_path for chunk in processed_chunks]
-        
-        # Create final output path
         output_filename = f"watermarked_{job_id}.pdf"
         output_path = os.path.join(config.OUTPUT_DIR, output_filename)
         
-        merge_chunks(chunk_paths, output_path, status_callback=status_callback)
+        with open(output_path, 'wb') as output_file:
+            writer.write(output_file)
+        
+        if status_callback:
+            status_callback("merging", progress=100)
         
         # Update status to finished
         if status_callback:
@@ -1,32 +1,47 @@
 """
 Job Queue Manager - Handles job queuing with JSON persistence
 """
-import json
+import atexit
+import heapq
+import mmap
+import multiprocessing
 import os
-import shutil
 import threading
 import time
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-import psutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+import orjson
 import config
+from utils.helpers import cleanup_job_files
+from utils.logger import get_logger
+from utils.sysinfo import get_children_rss, get_disk_usage, get_process_rss, refresh_disk_usage
+
+logger = get_logger("watermarks.queue")
 
 # Hardcoded container limit for Render (512MB container, use 450MB to be safe)
 RENDER_CONTAINER_LIMIT = 450 * 1024 * 1024  # 450MB in bytes
 
+# Job statuses returned by get_user_job
+USER_JOB_STATUSES = frozenset({'queued', 'processing', 'finished'})
+# Job statuses whose processing time counts toward the average
+COMPLETED_STATUSES = frozenset({'finished', 'downloaded'})
+
 
 def get_effective_available_ram() -> int:
     """
     Get effective available RAM considering Render's 512MB container limit.
     
     Hardcoded to 450MB limit (leaving 62MB for system overhead).
-    Calculates: 450MB - current_process_usage = available for jobs
+    Calculates: 450MB - (server process + worker processes usage) = available for jobs
     
     Returns:
         Effective available RAM in bytes
     """
-    # Get current process memory usage
-    current_usage = psutil.Process().memory_info().rss
+    # Jobs run in pool worker processes, which count against the same container limit
+    # (both readings cached briefly)
+    current_usage = get_process_rss() + get_children_rss()
     
     # Available = limit - current usage
     available = RENDER_CONTAINER_LIMIT - current_usage
@@ -35,6 +50,23 @@ def get_effective_available_ram() -> int:
     return max(0, available)
 
 
+def get_job_slot_count() -> int:
+    """
+    Number of jobs that can run at once without exceeding the container limit,
+    assuming every job is as large as the biggest accepted upload.
+    
+    Returns:
+        Worker slots (JOB_WORKERS, capped by RAM, at least 1)
+    """
+    ram_slots = RENDER_CONTAINER_LIMIT // max(1, config.PER_JOB_RAM_ESTIMATE)
+    return max(1, min(config.JOB_WORKERS, ram_slots))
+
+
+def _sync_file(f):
+    """Flush a file's data to the disk (fdatasync skips the metadata where available)"""
+    getattr(os, "fdatasync", os.fsync)(f.fileno())
+
+
 class JobQueueManager:
     """
     Manages job queue with JSON file persistence.
@@ -44,45 +76,371 @@ class JobQueueManager:
     def __init__(self, queue_file="queue.json"):
         self.queue_file = queue_file
         self.jobs: Dict[str, dict] = {}
+        self._waiting = deque()  # job_ids with status 'queued', oldest first
+        # Queue position is ticket - head ticket + 1, so appends and pops from the front
+        # don't have to renumber anyone
+        self._tickets: Dict[str, int] = {}
+        self._head_ticket = 0
+        # Secondary indices so per-request lookups don't scan every job
+        self._session_jobs: Dict[str, Dict[str, None]] = {}  # session_id -> job_ids (insertion-ordered set)
+        self._processing: Set[str] = set()  # job_ids with status 'processing'
+        # Estimated RAM/disk of the processing jobs, adjusted as jobs start and stop
+        self._active_ram = 0
+        self._active_disk = 0
+        # Processing times of the last 10 completed jobs; the average is recomputed on append
+        self._recent_durations = deque(maxlen=10)
+        self._average_processing_time: Optional[int] = None
         self.lock = threading.RLock()  # Use RLock for reentrant locking (prevents deadlock)
+        # Signalled whenever a job is added or resources may have been freed
+        self._changed = threading.Condition(self.lock)
+        self._change_count = 0
+        # (deadline, job_id) for finished/failed/downloaded jobs; the cleanup thread
+        # sleeps until the earliest one instead of polling. Entries can be stale - the
+        # job is re-checked when its entry comes due.
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._cleanup_cond = threading.Condition(self.lock)
+        self._cleanup_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="JobCleanup")
+        # Each change appends the changed jobs to a write-ahead log next to the snapshot;
+        # appends are coalesced (mutations set _dirty and a flusher thread writes them)
+        # and the cleanup thread folds the log into a new snapshot once it grows large
+        self._wal_path = f"{queue_file}.wal"
+        self._wal = None
+        self._wal_bytes = 0
+        self._unsynced_appends = 0
+        self._seq = 0  # Sequence number of the last WAL record (the snapshot stores the one it includes)
+        self._pending: Dict[str, None] = {}  # job_ids changed since the last write (insertion-ordered set)
+        self._dirty = threading.Event()
+        self._write_lock = threading.Lock()
+        self._flusher_running = False
         self._load_from_disk()
-        self._start_cleanup_thread()
+        # Job worker processes re-import the app module; only the server process runs cleanup
+        if multiprocessing.parent_process() is None:
+            self._start_cleanup_thread()
+            self._start_flusher_thread()
     
     def _load_from_disk(self):
-        """Load queue state from disk on startup"""
+        """Load queue state from disk on startup (snapshot, then replay the WAL)"""
         try:
+            snapshot_seq = 0
             if os.path.exists(self.queue_file):
-                with open(self.queue_file, 'r') as f:
-                    self.jobs = json.load(f)
-                print(f"✅ Loaded {len(self.jobs)} jobs from queue file")
+                # Parse straight from the page cache instead of reading a bytes copy first
+                with open(self.queue_file, 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                        memoryview(mapped) as view:
+                    data = orjson.loads(view)
+                if isinstance(data.get('seq'), int) and 'jobs' in data:
+                    snapshot_seq, self.jobs = data['seq'], data['jobs']
+                else:
+                    self.jobs = data  # Snapshot written before sequence numbers
             else:
                 self.jobs = {}
-                print("✅ Starting with empty queue")
+            self._seq = snapshot_seq
+            replayed = self._replay_wal(snapshot_seq)
+            queued = [j for j in self.jobs.values() if j.get('status') == 'queued']
+            queued.sort(key=lambda x: self._job_timestamp(x, 'queued_at') or 0)
+            self._waiting = deque(j['job_id'] for j in queued)
+            self._renumber_waiting()
+            with self.lock:
+                for job in self.jobs.values():
+                    self._index_job(job)
+                    self._schedule_expiry(job)
+                completed = [j for j in self.jobs.values() if j.get('status') in COMPLETED_STATUSES]
+                completed.sort(key=lambda x: self._job_timestamp(x, 'finished_at') or 0)
+                for job in completed[-10:]:
+                    self._record_duration(job)
+            if self.jobs:
+                logger.info("✅ Loaded %d jobs from queue file (%d WAL records)", len(self.jobs), replayed)
+            else:
+                logger.info("✅ Starting with empty queue")
         except Exception as e:
-            print(f"⚠️ Error loading queue file: {e}. Starting fresh.")
+            logger.warning("⚠️ Error loading queue file: %s. Starting fresh.", e)
             self.jobs = {}
     
+    def _replay_wal(self, snapshot_seq: int) -> int:
+        """
+        Apply WAL records written after the snapshot.
+        Records at or below the snapshot's sequence number are already in it (left
+        behind if we crashed between replacing the snapshot and truncating the WAL).
+        
+        Args:
+            snapshot_seq: Sequence number of the last change in the snapshot
+            
+        Returns:
+            Number of records applied
+        """
+        if not os.path.exists(self._wal_path):
+            return 0
+        applied = 0
+        with open(self._wal_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    break  # Torn last line from a crash mid-append
+                if record.get('seq', 0) <= snapshot_seq:
+                    continue
+                self._seq = record['seq']
+                if record['op'] == 'put':
+                    self.jobs[record['job']['job_id']] = record['job']
+                else:
+                    self.jobs.pop(record['job_id'], None)
+                applied += 1
+        self._wal_bytes = os.path.getsize(self._wal_path)
+        return applied
+    
     def _save_to_disk(self):
-        """Persist queue state to disk"""
+        """
+        Write a full snapshot (atomically - a crash mid-write leaves the old file)
+        and truncate the WAL, whose records the snapshot now contains.
+        """
+        try:
+            with self._write_lock:
+                with self.lock:
+                    self._pending.clear()
+                    # Every stored value is JSON-native (timestamps are ISO strings or epoch floats)
+                    snapshot = {"seq": self._seq, "jobs": self.jobs}
+                    data = orjson.dumps(snapshot, option=orjson.OPT_INDENT_2 if config.DEBUG else None)
+                tmp_path = f"{self.queue_file}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    _sync_file(f)  # On disk before it replaces the old snapshot
+                os.replace(tmp_path, self.queue_file)
+                if self._wal is not None:
+                    self._wal.close()
+                self._wal = open(self._wal_path, 'wb')
+                self._wal_bytes = 0
+                self._unsynced_appends = 0
+        except Exception as e:
+            logger.error("❌ Error saving queue: %s", e)
+    
+    def _append_to_wal(self):
+        """Append one record per job changed since the last write"""
         try:
-            with open(self.queue_file, 'w') as f:
-                json.dump(self.jobs, f, indent=2, default=str)
+            # Records are built and appended under the write lock, so a snapshot
+            # can't land between the two and be overwritten by older records on replay
+            with self._write_lock:
+                with self.lock:
+                    if not self._pending:
+                        return
+                    lines = []
+                    for job_id in self._pending:
+                        job = self.jobs.get(job_id)
+                        self._seq += 1
+                        if job is None:
+                            record = {"seq": self._seq, "op": "delete", "job_id": job_id}
+                        else:
+                            record = {"seq": self._seq, "op": "put", "job": job}
+                        lines.append(orjson.dumps(record))
+                    self._pending.clear()
+                data = b"\n".join(lines) + b"\n"
+                if self._wal is None:
+                    self._wal = open(self._wal_path, 'ab')
+                self._wal.write(data)
+                self._wal.flush()
+                self._wal_bytes += len(data)
+                # Sync only every few appends - a crash can lose the latest few changes,
+                # but callers don't wait on the disk for each one
+                self._unsynced_appends += 1
+                if self._unsynced_appends >= config.QUEUE_SYNC_EVERY:
+                    _sync_file(self._wal)
+                    self._unsynced_appends = 0
         except Exception as e:
-            print(f"❌ Error saving queue: {e}")
+            logger.error("❌ Error saving queue: %s", e)
+    
+    def compact(self):
+        """Fold the WAL into a new snapshot once it has grown past QUEUE_WAL_MAX_BYTES"""
+        if self._wal_bytes > config.QUEUE_WAL_MAX_BYTES:
+            self._save_to_disk()
+    
+    def _mark_dirty(self, *job_ids: str):
+        """Schedule WAL records for these jobs (written synchronously if there's no flusher thread)"""
+        self._pending.update(dict.fromkeys(job_ids))
+        if self._flusher_running:
+            self._dirty.set()
+        else:
+            self._append_to_wal()
+    
+    def _flush_dirty(self):
+        """Append pending changes to the WAL if any are scheduled"""
+        if self._dirty.is_set():
+            self._dirty.clear()
+            self._append_to_wal()
+    
+    def flush(self):
+        """Write pending changes now and sync them to the disk (call on shutdown)"""
+        self._flush_dirty()
+        with self._write_lock:
+            if self._wal is not None and self._unsynced_appends:
+                _sync_file(self._wal)
+                self._unsynced_appends = 0
+    
+    def _start_flusher_thread(self):
+        """Start background thread that appends to the WAL after changes settle"""
+        def flush_loop():
+            while True:
+                self._dirty.wait()
+                time.sleep(config.QUEUE_FLUSH_DELAY)  # Coalesce bursts of changes into one write
+                self._flush_dirty()
+        
+        self._flusher_running = True
+        thread = threading.Thread(target=flush_loop, daemon=True)
+        thread.start()
+        # The daemon thread dies with the interpreter - write anything still pending
+        # even if the app's shutdown handler never ran
+        atexit.register(self.flush)
+    
+    def _index_job(self, job: dict):
+        """Add a job to the session and processing indices (caller holds the lock)"""
+        self._session_jobs.setdefault(job.get('session_id'), {})[job['job_id']] = None
+        if job.get('status') == 'processing':
+            self._add_processing(job)
+    
+    def _unindex_job(self, job: dict):
+        """Remove a job from the session and processing indices (caller holds the lock)"""
+        session_jobs = self._session_jobs.get(job.get('session_id'))
+        if session_jobs is not None:
+            session_jobs.pop(job['job_id'], None)
+            if not session_jobs:
+                del self._session_jobs[job.get('session_id')]
+        self._discard_processing(job['job_id'])
+    
+    def _add_processing(self, job: dict):
+        """Track a job as processing and add its estimated resources (caller holds the lock)"""
+        if job['job_id'] not in self._processing:
+            self._processing.add(job['job_id'])
+            ram, disk = self._estimated_usage(job)
+            self._active_ram += ram
+            self._active_disk += disk
+    
+    def _discard_processing(self, job_id: str):
+        """Stop tracking a job as processing and release its estimated resources (caller holds the lock)"""
+        if job_id in self._processing:
+            self._processing.remove(job_id)
+            ram, disk = self._estimated_usage(self.jobs[job_id])
+            self._active_ram -= ram
+            self._active_disk -= disk
+    
+    @staticmethod
+    def _estimated_usage(job: dict) -> Tuple[int, int]:
+        """
+        Estimated (RAM, disk) bytes for processing a job, computed once at add_job.
+        Jobs saved before the estimates existed are computed once and backfilled.
+        
+        Args:
+            job: Job dict
+            
+        Returns:
+            (estimated_ram, estimated_disk)
+        """
+        if 'estimated_ram' not in job:
+            job['estimated_ram'] = int(job.get('file_size', 0) * config.RAM_USAGE_MULTIPLIER)
+            job['estimated_disk'] = int(job.get('file_size', 0) * config.DISK_USAGE_MULTIPLIER)
+        return job['estimated_ram'], job['estimated_disk']
+    
+    @staticmethod
+    def _job_timestamp(job: dict, field: str) -> Optional[float]:
+        """
+        Epoch seconds for an ISO timestamp field, from its `<field>_ts` sibling.
+        Jobs saved before the sibling existed are parsed once and backfilled.
+        
+        Args:
+            job: Job dict
+            field: Name of the ISO timestamp field
+            
+        Returns:
+            Epoch seconds, or None if the field is unset or invalid
+        """
+        ts = job.get(f"{field}_ts")
+        if ts is None and job.get(field):
+            try:
+                ts = datetime.fromisoformat(job[field]).timestamp()
+            except (TypeError, ValueError):
+                return None
+            job[f"{field}_ts"] = ts
+        return ts
+    
+    def _renumber_waiting(self):
+        """Reassign queue tickets after a job is inserted or removed mid-queue (caller holds the lock)"""
+        self._tickets = {job_id: i for i, job_id in enumerate(self._waiting)}
+        self._head_ticket = 0
     
     def _start_cleanup_thread(self):
-        """Start background thread for cleanup"""
+        """Start background thread that removes jobs as their expiry deadlines pass"""
         def cleanup_loop():
             while True:
                 try:
+                    with self._cleanup_cond:
+                        # Wake at the next deadline (re-armed by _schedule_expiry);
+                        # at least every 30 seconds so the WAL still gets compacted
+                        timeout = 30
+                        if self._expiry_heap:
+                            timeout = min(timeout, max(0, self._expiry_heap[0][0] - time.time()))
+                        self._cleanup_cond.wait(timeout=timeout)
                     self.cleanup_expired_jobs()
-                    time.sleep(30)  # Check every 30 seconds
+                    refresh_disk_usage(config.TEMP_DIR)  # Admission checks see space freed by cleanup
+                    self.compact()
                 except Exception as e:
-                    print(f"Cleanup error: {e}")
+                    logger.exception("Cleanup error: %s", e)
         
         thread = threading.Thread(target=cleanup_loop, daemon=True)
         thread.start()
     
+    def _expiry_deadline(self, job: dict) -> Optional[float]:
+        """Epoch seconds after which a job is cleaned up, or None if it doesn't expire yet"""
+        if job.get('status') == 'downloaded':
+            return 0  # Delete right away
+        
+        # Download window (finished jobs)
+        expires = self._job_timestamp(job, 'download_window_expires')
+        if expires is not None:
+            return expires
+        
+        # Old errors (after 1 hour)
+        if job.get('status') == 'error':
+            finished = self._job_timestamp(job, 'finished_at')
+            if finished is not None:
+                return finished + 3600
+        return None
+    
+    def _schedule_expiry(self, job: dict):
+        """Queue a job's expiry deadline, waking the cleanup thread if it's the earliest (caller holds the lock)"""
+        deadline = self._expiry_deadline(job)
+        if deadline is None:
+            return
+        heapq.heappush(self._expiry_heap, (deadline, job['job_id']))
+        if self._expiry_heap[0][1] == job['job_id']:
+            self._cleanup_cond.notify()
+    
+    def _notify_change(self):
+        """Wake the queue processor (caller holds the lock)"""
+        self._change_count += 1
+        self._changed.notify_all()
+    
+    @property
+    def change_count(self) -> int:
+        """Counter bumped on every queue change (pass to wait_for_change)"""
+        return self._change_count
+    
+    def wait_for_change(self, seen: int, timeout: float) -> bool:
+        """
+        Block until the queue changes after `seen` was read, or timeout.
+        
+        Args:
+            seen: change_count read before the caller last looked at the queue
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            True if the queue changed, False on timeout
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: self._change_count != seen, timeout=timeout)
+    
+    def wake(self):
+        """Wake anything blocked in wait_for_change (e.g. on shutdown)"""
+        with self.lock:
+            self._notify_change()
+    
     def check_disk_space(self, required_bytes: int) -> Tuple[bool, str]:
         """
         Check if sufficient disk space is available.
@@ -94,7 +452,7 @@ class JobQueueManager:
             (has_space, message)
         """
         try:
-            disk = shutil.disk_usage(config.TEMP_DIR)
+            disk = get_disk_usage(config.TEMP_DIR)
             
             # Need space for: upload + processed output + safety buffer
             required = required_bytes * 2 + (150 * 1024 * 1024)  # 2x file + 150MB buffer
@@ -108,47 +466,42 @@ class JobQueueManager:
         except Exception as e:
             return False, f"Error checking disk space: {str(e)}"
     
-    def can_accept_job(self, session_id: str, file_size: int, file_in_memory: bool = False) -> Tuple[bool, str, Optional[dict]]:
+    def can_accept_job(self, session_id: str, file_size: int) -> Tuple[bool, str, Optional[dict]]:
         """
         Check if job can be accepted.
         
         Args:
             session_id: User session identifier
             file_size: Size of file in bytes
-            file_in_memory: If True, file is already loaded in RAM (during upload check)
             
         Returns:
             (can_accept, message, retry_info)
         """
-        with self.lock:
-            # REMOVED: One job per user restriction
-            # Users can now upload multiple files concurrently
-            
-            # Check disk space (dynamic limit)
-            has_space, space_msg = self.check_disk_space(file_size)
-            if not has_space:
-                # Estimate when space might be available
-                retry_seconds = self.estimate_space_available_time()
-                return False, space_msg, {
-                    "retry_after_seconds": retry_seconds,
-                    "reason": "disk_space"
-                }
-            
-            # Check memory (using container-aware RAM detection)
-            available_ram = get_effective_available_ram()
-            
-            # If file is already in memory (during upload), account for it
-            if file_in_memory:
-                available_ram -= file_size
-            
-            if available_ram < config.MIN_FREE_RAM_REQUIRED:
-                retry_seconds = self.estimate_memory_available_time()
-                return False, "Server memory insufficient. Please try again shortly.", {
-                    "retry_after_seconds": retry_seconds,
-                    "reason": "memory"
-                }
-            
-            return True, "OK", None
+        # Only cached disk/RAM readings are checked - no job state, so no queue lock
+        # REMOVED: One job per user restriction
+        # Users can now upload multiple files concurrently
+        
+        # Check disk space (dynamic limit)
+        has_space, space_msg = self.check_disk_space(file_size)
+        if not has_space:
+            # Estimate when space might be available
+            retry_seconds = self.estimate_space_available_time()
+            return False, space_msg, {
+                "retry_after_seconds": retry_seconds,
+                "reason": "disk_space"
+            }
+        
+        # Check memory (using container-aware RAM detection)
+        available_ram = get_effective_available_ram()
+        
+        if available_ram < config.MIN_FREE_RAM_REQUIRED:
+            retry_seconds = self.estimate_memory_available_time()
+            return False, "Server memory insufficient. Please try again shortly.", {
+                "retry_after_seconds": retry_seconds,
+                "reason": "memory"
+            }
+        
+        return True, "OK", None
     
     def add_job(self, job_id: str, session_id: str, file_path: str, file_size: int, chunk_size: int):
         """
@@ -162,7 +515,7 @@ class JobQueueManager:
             chunk_size: Pages per chunk
         """
         with self.lock:
-            queue_count = self.get_queue_count()
+            now = time.time()
             
             self.jobs[job_id] = {
                 "job_id": job_id,
@@ -170,58 +523,75 @@ class JobQueueManager:
                 "file_path": file_path,
                 "file_size": file_size,
                 "chunk_size": chunk_size,
+                "estimated_ram": int(file_size * config.RAM_USAGE_MULTIPLIER),
+                "estimated_disk": int(file_size * config.DISK_USAGE_MULTIPLIER),
                 "status": "queued",
-                "queue_position": queue_count + 1,
-                "queued_at": datetime.now().isoformat(),
+                "queued_at": datetime.fromtimestamp(now).isoformat(),
+                "queued_at_ts": now,
                 "started_at": None,
+                "started_at_ts": None,
                 "finished_at": None,
                 "download_window_expires": None
             }
+            self._tickets[job_id] = self._head_ticket + len(self._waiting)
+            self._waiting.append(job_id)  # Position is derived from the ticket, not stored
+            self._index_job(self.jobs[job_id])
             
-            self._save_to_disk()
+            self._mark_dirty(job_id)
+            self._notify_change()
     
     def get_job(self, job_id: str) -> Optional[dict]:
         """Get job by ID"""
+        # A single dict lookup is atomic under the GIL, so readers don't queue behind writers
+        return self.jobs.get(job_id)
+    
+    def is_download_expired(self, job: dict) -> bool:
+        """True if a finished job's download window has closed"""
+        expires = self._job_timestamp(job, 'download_window_expires')
+        return expires is not None and time.time() > expires
+    
+    def get_job_snapshot(self, job_id: str) -> Optional[Tuple[dict, int, int]]:
+        """
+        Get a job with its queue position and estimated wait in one lock acquisition.
+        
+        Args:
+            job_id: Job identifier
+            
+        Returns:
+            (job, position, wait_seconds) or None if not found; position and
+            wait are 0 unless the job is queued
+        """
         with self.lock:
-            return self.jobs.get(job_id)
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            position = self.get_queue_position(job_id) if job.get('status') == 'queued' else 0
+            return job, position, self._estimate_wait_for_position(position)
     
     def get_user_job(self, session_id: str) -> Optional[dict]:
         """Get active job for a session"""
         with self.lock:
-            for job in self.jobs.values():
-                if job.get('session_id') == session_id:
-                    status = job.get('status')
-                    if status in ['queued', 'processing', 'finished']:
-                        return job
+            for job_id in self._session_jobs.get(session_id, ()):
+                job = self.jobs[job_id]
+                if job.get('status') in USER_JOB_STATUSES:
+                    return job
             return None
     
     def get_queue_count(self) -> int:
         """Get number of queued jobs"""
-        return sum(1 for j in self.jobs.values() if j.get('status') == 'queued')
+        return len(self._waiting)
     
     def get_processing_count(self) -> int:
         """Get number of jobs being processed"""
-        return sum(1 for j in self.jobs.values() if j.get('status') == 'processing')
+        return len(self._processing)
     
     def get_queue_position(self, job_id: str) -> int:
         """Get position in queue (1-indexed)"""
         with self.lock:
-            job = self.jobs.get(job_id)
-            if not job or job.get('status') != 'queued':
+            ticket = self._tickets.get(job_id)
+            if ticket is None:
                 return 0
-            
-            # Find all queued jobs and sort by queued_at
-            queued_jobs = [
-                j for j in self.jobs.values() 
-                if j.get('status') == 'queued'
-            ]
-            queued_jobs.sort(key=lambda x: x.get('queued_at', ''))
-            
-            for i, j in enumerate(queued_jobs):
-                if j['job_id'] == job_id:
-                    return i + 1
-            
-            return 0
+            return ticket - self._head_ticket + 1
     
     def estimate_wait_time(self, job_id: str) -> int:
         """
@@ -233,7 +603,10 @@ class JobQueueManager:
         Returns:
             Estimated seconds
         """
-        position = self.get_queue_position(job_id)
+        return self._estimate_wait_for_position(self.get_queue_position(job_id))
+    
+    def _estimate_wait_for_position(self, position: int) -> int:
+        """Estimated seconds until the job at this (1-indexed) queue position starts"""
         if position == 0:
             return 0
         
@@ -246,28 +619,17 @@ class JobQueueManager:
         return (position) * avg_time
     
     def get_average_processing_time(self) -> Optional[int]:
-        """Calculate average processing time from recent completed jobs"""
-        with self.lock:
-            completed = [
-                j for j in self.jobs.values()
-                if j.get('status') in ['finished', 'downloaded'] 
-                and j.get('started_at') 
-                and j.get('finished_at')
-            ]
-            
-            if not completed:
-                return None
-            
-            total_time = 0
-            for job in completed[-10:]:  # Last 10 jobs
-                try:
-                    started = datetime.fromisoformat(job['started_at'])
-                    finished = datetime.fromisoformat(job['finished_at'])
-                    total_time += (finished - started).total_seconds()
-                except:
-                    pass
-            
-            return int(total_time / len(completed)) if completed else None
+        """Average processing time of the last 10 completed jobs (None until one completes)"""
+        return self._average_processing_time
+    
+    def _record_duration(self, job: dict):
+        """Add a completed job's processing time to the rolling average (caller holds the lock)"""
+        started = self._job_timestamp(job, 'started_at')
+        finished = self._job_timestamp(job, 'finished_at')
+        if started is None or finished is None:
+            return
+        self._recent_durations.append(finished - started)
+        self._average_processing_time = int(sum(self._recent_durations) / len(self._recent_durations))
     
     def estimate_space_available_time(self) -> int:
         """Estimate when disk space will be available"""
@@ -288,33 +650,17 @@ class JobQueueManager:
     
     def get_active_resource_usage(self) -> dict:
         """
-        Calculate total RAM and disk usage by active jobs.
-        Active jobs include: processing, splitting, adding_watermarks, merging.
+        Total estimated RAM and disk usage of active (processing) jobs.
+        Sums are kept up to date as jobs start and stop, so this doesn't scan jobs.
         
         Returns:
             dict with ram_used, disk_used, active_count
         """
         with self.lock:
-            active_statuses = ['processing', 'splitting', 'adding_watermarks', 'merging']
-            active_jobs = [
-                j for j in self.jobs.values()
-                if j.get('status') in active_statuses
-            ]
-            
-            # Estimate resources used by active jobs
-            total_ram = sum(
-                int(j.get('file_size', 0) * config.RAM_USAGE_MULTIPLIER)
-                for j in active_jobs
-            )
-            total_disk = sum(
-                int(j.get('file_size', 0) * config.DISK_USAGE_MULTIPLIER)
-                for j in active_jobs
-            )
-            
             return {
-                'ram_used': total_ram,
-                'disk_used': total_disk,
-                'active_count': len(active_jobs)
+                'ram_used': self._active_ram,
+                'disk_used': self._active_disk,
+                'active_count': len(self._processing)
             }
     
     def pop_next_job(self) -> Optional[dict]:
@@ -325,152 +671,202 @@ class JobQueueManager:
         Returns:
             Job dict or None if no job ready or insufficient resources
         """
+        if not self._waiting:
+            return None  # Nothing queued - skip the resource readings
+        
+        # Read available resources (container-aware RAM) before taking the lock:
+        # they don't depend on queue state, and a cache refresh is a syscall
+        available_ram = get_effective_available_ram()
+        workers_rss = get_children_rss()
+        disk = get_disk_usage(config.TEMP_DIR)
+        
         with self.lock:
-            # Get current resource usage by active jobs
-            usage = self.get_active_resource_usage()
-            
-            # Check available resources (container-aware RAM)
-            available_ram = get_effective_available_ram()
-            disk = shutil.disk_usage(config.TEMP_DIR)
-            
             # Get oldest queued job
-            queued_jobs = [
-                j for j in self.jobs.values()
-                if j.get('status') == 'queued'
-            ]
-            
-            if not queued_jobs:
+            if not self._waiting:
                 return None
+            next_job = self.jobs[self._waiting[0]]
             
-            queued_jobs.sort(key=lambda x: x.get('queued_at', ''))
-            next_job = queued_jobs[0]
+            # Get current resource usage by active jobs
+            usage = self.get_active_resource_usage()
             
             # Estimate resources needed for this job
-            estimated_ram = int(next_job['file_size'] * config.RAM_USAGE_MULTIPLIER)
-            estimated_disk = int(next_job['file_size'] * config.DISK_USAGE_MULTIPLIER)
+            estimated_ram, estimated_disk = self._estimated_usage(next_job)
             
-            # Check if we can start this job without exceeding buffers
-            ram_after = available_ram - estimated_ram
+            # Check if we can start this job without exceeding buffers.
+            # Worker RSS is already out of available_ram, so active jobs only reserve
+            # the part of their estimate the workers haven't grown into yet.
+            reserved_ram = max(0, usage['ram_used'] - workers_rss)
+            ram_after = available_ram - reserved_ram - estimated_ram
             disk_after = disk.free - estimated_disk
             
             # Must maintain minimum buffers
             if ram_after < config.MIN_RAM_BUFFER:
-                print(f"⏸️  [QUEUE] Cannot start job {next_job['job_id']}: would leave only {ram_after / (1024*1024):.1f}MB RAM (need {config.MIN_RAM_BUFFER / (1024*1024):.0f}MB buffer)")
+                logger.debug("⏸️  [QUEUE] Cannot start job %s: would leave only %.1fMB RAM (need %.0fMB buffer)",
+                             next_job['job_id'], ram_after / (1024*1024), config.MIN_RAM_BUFFER / (1024*1024))
                 return None
             
             if disk_after < config.MIN_DISK_BUFFER:
-                print(f"⏸️  [QUEUE] Cannot start job {next_job['job_id']}: would leave only {disk_after / (1024*1024):.1f}MB disk (need {config.MIN_DISK_BUFFER / (1024*1024):.0f}MB buffer)")
+                logger.debug("⏸️  [QUEUE] Cannot start job %s: would leave only %.1fMB disk (need %.0fMB buffer)",
+                             next_job['job_id'], disk_after / (1024*1024), config.MIN_DISK_BUFFER / (1024*1024))
                 return None
             
             # Safe to start this job!
-            print(f"🚀 [QUEUE] Starting job {next_job['job_id']} (estimated: {estimated_ram / (1024*1024):.1f}MB RAM, {estimated_disk / (1024*1024):.1f}MB disk)")
-            print(f"📊 [QUEUE] Active jobs: {usage['active_count']}, RAM after: {ram_after / (1024*1024):.1f}MB, Disk after: {disk_after / (1024*1024):.1f}MB")
+            logger.info("🚀 [QUEUE] Starting job %s (estimated: %.1fMB RAM, %.1fMB disk)",
+                        next_job['job_id'], estimated_ram / (1024*1024), estimated_disk / (1024*1024))
+            logger.debug("📊 [QUEUE] Active jobs: %d, RAM after: %.1fMB, Disk after: %.1fMB",
+                         usage['active_count'], ram_after / (1024*1024), disk_after / (1024*1024))
             
             # Mark as processing
+            self._waiting.popleft()
+            del self._tickets[next_job['job_id']]
+            self._head_ticket += 1
             next_job['status'] = 'processing'
-            next_job['started_at'] = datetime.now().isoformat()
-            self._save_to_disk()
+            now = time.time()
+            next_job['started_at'] = datetime.fromtimestamp(now).isoformat()
+            next_job['started_at_ts'] = now
+            self._add_processing(next_job)
+            self._mark_dirty(next_job['job_id'])
             
             return next_job
     
+    def requeue_job(self, job_id: str):
+        """Put a job that never started back at its place in the queue"""
+        with self.lock:
+            if job_id in self.jobs and self.jobs[job_id]['status'] == 'processing':
+                job = self.jobs[job_id]
+                job['status'] = 'queued'
+                job['started_at'] = None
+                job['started_at_ts'] = None
+                self._discard_processing(job_id)
+                # Back in queued_at order (usually the front)
+                queued_at = self._job_timestamp(job, 'queued_at') or 0
+                position = sum(
+                    1 for other in self._waiting
+                    if (self._job_timestamp(self.jobs[other], 'queued_at') or 0) < queued_at
+                )
+                self._waiting.insert(position, job_id)
+                self._renumber_waiting()
+                self._mark_dirty(job_id)
+                self._notify_change()
+    
     def mark_finished(self, job_id: str):
         """Mark job as finished and start download window"""
         with self.lock:
             if job_id in self.jobs:
                 self.jobs[job_id]['status'] = 'finished'
-                self.jobs[job_id]['finished_at'] = datetime.now().isoformat()
+                self._discard_processing(job_id)
+                now = time.time()
+                self.jobs[job_id]['finished_at'] = datetime.fromtimestamp(now).isoformat()
+                self.jobs[job_id]['finished_at_ts'] = now
+                self._record_duration(self.jobs[job_id])
                 # Start 1-minute download window
-                expires = datetime.now() + timedelta(minutes=1)
-                self.jobs[job_id]['download_window_expires'] = expires.isoformat()
-                self._save_to_disk()
+                expires = now + 60
+                self.jobs[job_id]['download_window_expires'] = datetime.fromtimestamp(expires).isoformat()
+                self.jobs[job_id]['download_window_expires_ts'] = expires
+                self._schedule_expiry(self.jobs[job_id])
+                self._mark_dirty(job_id)
+                self._notify_change()
     
     def mark_error(self, job_id: str, error: str):
         """Mark job as failed"""
         with self.lock:
             if job_id in self.jobs:
                 self.jobs[job_id]['status'] = 'error'
+                self._discard_processing(job_id)
                 self.jobs[job_id]['error'] = error
-                self.jobs[job_id]['finished_at'] = datetime.now().isoformat()
-                self._save_to_disk()
+                now = time.time()
+                self.jobs[job_id]['finished_at'] = datetime.fromtimestamp(now).isoformat()
+                self.jobs[job_id]['finished_at_ts'] = now
+                self._schedule_expiry(self.jobs[job_id])
+                self._mark_dirty(job_id)
+                self._notify_change()
     
     def mark_downloaded(self, job_id: str):
         """Mark job as downloaded (for cleanup)"""
         with self.lock:
             if job_id in self.jobs:
                 self.jobs[job_id]['status'] = 'downloaded'
+                self._discard_processing(job_id)
                 self.jobs[job_id]['downloaded_at'] = datetime.now().isoformat()
-                self._save_to_disk()
+                self._schedule_expiry(self.jobs[job_id])
+                self._mark_dirty(job_id)
+                self._notify_change()
     
     def cleanup_expired_jobs(self):
-        """Remove jobs past their download window"""
+        """Remove jobs whose expiry deadline has passed"""
         with self.lock:
-            now = datetime.now()
-            to_delete = []
-            
-            for job_id, job in self.jobs.items():
-                # Delete if download window expired
-                if job.get('download_window_expires'):
-                    try:
-                        expires = datetime.fromisoformat(job['download_window_expires'])
-                        if now > expires:
-                            to_delete.append(job_id)
-                    except:
-                        pass
-                
-                # Delete if downloaded
-                if job.get('status') == 'downloaded':
-                    to_delete.append(job_id)
-                
-                # Delete old errors (after 1 hour)
-                if job.get('status') == 'error':
-                    try:
-                        finished = datetime.fromisoformat(job.get('finished_at', ''))
-                        if now > finished + timedelta(hours=1):
-                            to_delete.append(job_id)
-                    except:
-                        pass
+            now = time.time()
+            to_delete = set()  # A job can have more than one heap entry
+            
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                _, job_id = heapq.heappop(self._expiry_heap)
+                job = self.jobs.get(job_id)
+                # Stale entry if the job is gone or its deadline has since moved
+                deadline = self._expiry_deadline(job) if job is not None else None
+                if deadline is not None and deadline <= now:
+                    to_delete.add(job_id)
+            
+            if not to_delete:
+                return
+            
+            # Detach the jobs under the lock; their files are deleted after it's released
+            expired = []
+            for job_id in to_delete:
+                job = self.jobs[job_id]
+                self._unindex_job(job)  # Before the pop: it looks the job up to release its usage
+                del self.jobs[job_id]
+                expired.append(job)
             
-            if to_delete:
-                for job_id in to_delete:
-                    # Clean up files
-                    job = self.jobs[job_id]
-                    self._cleanup_job_files(job)
-                    del self.jobs[job_id]
-                
-                self._save_to_disk()
-                print(f"🧹 Cleaned up {len(to_delete)} expired jobs")
+            self._mark_dirty(*to_delete)
+            self._notify_change()
+        
+        # Deletions are I/O-bound; overlap them (map waits so disk usage is refreshed after)
+        list(self._cleanup_pool.map(self._cleanup_job_files, expired))
+        logger.info("🧹 Cleaned up %d expired jobs", len(expired))
     
     def _cleanup_job_files(self, job: dict):
         """Delete files for a job"""
         try:
             file_path = job.get('file_path')
-            if file_path and os.path.exists(file_path):
-                os.remove(file_path)
+            if file_path:
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass  # Usually the upload path, which cleanup_job_files also covers
             
             # Clean up temp processing files
-            job_id = job['job_id']
-            from utils.helpers import cleanup_job_files
-            cleanup_job_files(job_id)
+            cleanup_job_files(job['job_id'])
         except Exception as e:
-            print(f"Error cleaning up job files: {e}")
+            logger.error("Error cleaning up job files: %s", e)
     
     def delete_job(self, job_id: str):
         """Manually delete a job"""
         with self.lock:
-            if job_id in self.jobs:
-                job = self.jobs[job_id]
-                self._cleanup_job_files(job)
-                del self.jobs[job_id]
-                self._save_to_disk()
+            if job_id not in self.jobs:
+                return
+            job = self.jobs[job_id]
+            if job.get('status') == 'queued':
+                self._waiting.remove(job_id)
+                self._renumber_waiting()
+            self._unindex_job(job)
+            del self.jobs[job_id]
+            self._mark_dirty(job_id)
+            self._notify_change()
+        # The job is detached, so its files can go without holding the lock
+        self._cleanup_job_files(job)
 
 
-# Global singleton
+# Global singleton (created on first use, so importing this module doesn't load queue.json)
 _queue_manager = None
+_queue_manager_lock = threading.Lock()
 
 
 def get_queue_manager() -> JobQueueManager:
     """Get global queue manager instance"""
     global _queue_manager
     if _queue_manager is None:
-        _queue_manager = JobQueueManager()
+        with _queue_manager_lock:
+            # Re-check: another thread may have created it while we waited
+            if _queue_manager is None:
+                _queue_manager = JobQueueManager()
     return _queue_manager
@@ -2,12 +2,29 @@
 Status Manager Module - Handles job status tracking and management
 """
 import threading
-from typing import Dict, Optional
+from itertools import islice
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Protocol, Tuple
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+import orjson
 import config
 
 
+# Progress set automatically when a job enters a status
+STATUS_PROGRESS = {
+    "uploading": 10,
+    "splitting": 30,
+    "adding_watermarks": 50,
+    "merging": 80,
+    "finished": 100,
+    "error": 0
+}
+
+# Statuses counted by count_active_jobs
+ACTIVE_STATUSES = frozenset({"uploading", "splitting", "adding_watermarks", "merging"})
+
+
 @dataclass
 class JobStatus:
     """Status information for a processing job"""
@@ -19,6 +36,7 @@ class JobStatus:
     error: Optional[str] = None
     created_at: datetime = None
     updated_at: datetime = None
+    version: int = 0  # Bumped on every update (invalidates cached JSON)
     
     def __post_init__(self):
         if self.created_at is None:
@@ -27,12 +45,83 @@ class JobStatus:
             self.updated_at = datetime.now()
     
     def to_dict(self) -> dict:
-        """Convert to dictionary for API responses"""
-        data = asdict(self)
-        # Convert datetime to ISO format strings
-        data['created_at'] = self.created_at.isoformat() if self.created_at else None
-        data['updated_at'] = self.updated_at.isoformat() if self.updated_at else None
-        return data
+        """Convert to dictionary for API responses (fields listed directly - asdict deep-copies)"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result_path": self.result_path,
+            "error": self.error,
+            # Convert datetime to ISO format strings
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "version": self.version
+        }
+    
+    def to_json(self) -> bytes:
+        """Serialize all fields (admin listing); orjson encodes the datetimes as ISO strings"""
+        return orjson.dumps({
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result_path": self.result_path,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "version": self.version
+        })
+    
+    def to_status_json(self) -> bytes:
+        """Serialize to the /api/status response body"""
+        return orjson.dumps({
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result_path": self.result_path,
+            "error": self.error,
+            "version": self.version,
+            "queue_position": 0,
+            "jobs_ahead": 0,
+            "estimated_wait_seconds": None,
+            "estimated_start_time": None
+        })
+
+
+class StatusStore(Protocol):
+    """Interface shared by StatusManager (in-process) and RedisStatusManager"""
+    
+    def create_job(self, job_id: str, initial_message: str = "Job created") -> JobStatus: ...
+    
+    def update_status(
+        self,
+        job_id: str,
+        status: str = None,
+        progress: int = None,
+        message: str = None,
+        result_path: str = None,
+        error: str = None
+    ) -> Optional[JobStatus]: ...
+    
+    def get_status(self, job_id: str) -> Optional[JobStatus]: ...
+    
+    def get_status_json(self, job_id: str) -> Optional[Tuple[int, datetime, bytes]]: ...
+    
+    def job_exists(self, job_id: str) -> bool: ...
+    
+    def delete_job(self, job_id: str) -> bool: ...
+    
+    def cleanup_old_jobs(self, max_age_hours: int = None) -> int: ...
+    
+    def get_all_jobs(self) -> Mapping[str, JobStatus]: ...
+    
+    def snapshot_all_jobs(self) -> List[Tuple[str, JobStatus]]: ...
+    
+    def get_jobs_page(self, limit: int, offset: int = 0, status: str = None) -> Tuple[int, List[JobStatus]]: ...
+    
+    def count_active_jobs(self) -> int: ...
 
 
 class StatusManager:
@@ -40,6 +129,8 @@ class StatusManager:
     
     def __init__(self):
         self._statuses: Dict[str, JobStatus] = {}
+        self._statuses_view = MappingProxyType(self._statuses)
+        self._json_cache: Dict[str, Tuple[int, bytes]] = {}  # job_id -> (version, body)
         self._lock = threading.Lock()
     
     def create_job(self, job_id: str, initial_message: str = "Job created") -> JobStatus:
@@ -60,6 +151,8 @@ class StatusManager:
                 progress=0,
                 message=initial_message
             )
+            # Re-created jobs move to the end, so the dict stays in created_at order
+            self._statuses.pop(job_id, None)
             self._statuses[job_id] = status
             return status
     
@@ -96,18 +189,8 @@ class StatusManager:
                 job.status = status
                 
                 # Automatically set progress based on status
-                if status == "uploading":
-                    job.progress = 10
-                elif status == "splitting":
-                    job.progress = 30
-                elif status == "adding_watermarks":
-                    job.progress = 50
-                elif status == "merging":
-                    job.progress = 80
-                elif status == "finished":
-                    job.progress = 100
-                elif status == "error":
-                    job.progress = 0
+                if status in STATUS_PROGRESS:
+                    job.progress = STATUS_PROGRESS[status]
             
             if progress is not None:
                 job.progress = max(0, min(100, progress))  # Clamp between 0-100
@@ -123,6 +206,7 @@ class StatusManager:
                 job.status = "error"
             
             job.updated_at = datetime.now()
+            job.version += 1
             
             return job
     
@@ -139,6 +223,28 @@ class StatusManager:
         with self._lock:
             return self._statuses.get(job_id)
     
+    def get_status_json(self, job_id: str) -> Optional[Tuple[int, datetime, bytes]]:
+        """
+        Get the serialized status of a job.
+        The body is rendered once per update and reused for every poll in between.
+        
+        Args:
+            job_id: Job identifier
+            
+        Returns:
+            (version, updated_at, JSON body) or None if not found
+        """
+        with self._lock:
+            job = self._statuses.get(job_id)
+            if job is None:
+                return None
+            
+            cached = self._json_cache.get(job_id)
+            if cached is None or cached[0] != job.version:
+                cached = (job.version, job.to_status_json())
+                self._json_cache[job_id] = cached
+            return job.version, job.updated_at, cached[1]
+    
     def job_exists(self, job_id: str) -> bool:
         """
         Check if a job exists.
@@ -165,6 +271,7 @@ class StatusManager:
         with self._lock:
             if job_id in self._statuses:
                 del self._statuses[job_id]
+                self._json_cache.pop(job_id, None)
                 return True
             return False
     
@@ -184,25 +291,61 @@ class StatusManager:
         cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
         
         with self._lock:
-            jobs_to_delete = [
-                job_id for job_id, status in self._statuses.items()
-                if status.created_at < cutoff_time
-            ]
+            # Jobs are kept in creation order, so the old ones are a prefix:
+            # stop at the first job that is new enough
+            jobs_to_delete = []
+            for job_id, status in self._statuses.items():
+                if status.created_at >= cutoff_time:
+                    break
+                jobs_to_delete.append(job_id)
             
             for job_id in jobs_to_delete:
                 del self._statuses[job_id]
+                self._json_cache.pop(job_id, None)
             
             return len(jobs_to_delete)
     
-    def get_all_jobs(self) -> Dict[str, JobStatus]:
+    def get_all_jobs(self) -> Mapping[str, JobStatus]:
         """
         Get all job statuses (for debugging/admin).
+        The view is live and read-only: lookups are fine, but iterate over
+        snapshot_all_jobs() instead, since jobs may be added while iterating.
+        
+        Returns:
+            Read-only mapping of all jobs
+        """
+        return self._statuses_view
+    
+    def snapshot_all_jobs(self) -> List[Tuple[str, JobStatus]]:
+        """
+        Get a point-in-time list of all (job_id, status) pairs, safe to iterate.
         
         Returns:
-            Dictionary of all jobs
+            List of (job_id, JobStatus)
         """
         with self._lock:
-            return self._statuses.copy()
+            return list(self._statuses.items())
+    
+    def get_jobs_page(self, limit: int, offset: int = 0, status: str = None) -> Tuple[int, List[JobStatus]]:
+        """
+        Get one page of jobs in creation order (for admin listing).
+        
+        Args:
+            limit: Maximum number of jobs to return
+            offset: Number of matching jobs to skip
+            status: Only include jobs with this status
+            
+        Returns:
+            (number of matching jobs, jobs on this page)
+        """
+        with self._lock:
+            if status is None:
+                total = len(self._statuses)
+                matching = iter(self._statuses.values())
+            else:
+                total = sum(1 for job in self._statuses.values() if job.status == status)
+                matching = (job for job in self._statuses.values() if job.status == status)
+            return total, list(islice(matching, offset, offset + limit))
     
     def count_active_jobs(self) -> int:
         """
@@ -211,19 +354,248 @@ class StatusManager:
         Returns:
             Number of active jobs
         """
-        active_statuses = ["uploading", "splitting", "adding_watermarks", "merging"]
-        
         with self._lock:
             return sum(
                 1 for status in self._statuses.values()
-                if status.status in active_statuses
+                if status.status in ACTIVE_STATUSES
             )
 
 
+class RedisStatusManager:
+    """
+    Status manager backed by Redis, so every server process sees every job.
+    Implements StatusStore, like StatusManager. Each job is a hash at job:{id} that
+    expires after JOB_RETENTION_HOURS. Sorted sets scored by creation time index
+    them (jobs:by_created for all jobs, jobs:status:{status} per status), and the
+    jobs:active set holds the ones processing.
+    """
+    
+    ALL_KEY = "jobs:by_created"
+    STATUS_KEY_PREFIX = "jobs:status:"
+    ACTIVE_KEY = "jobs:active"
+    
+    # HSET only if the job hash still exists, so a concurrent delete or expiry
+    # can't leave a partial hash behind; a status change moves the job between
+    # status indexes. KEYS: job hash, active set, creation index.
+    # ARGV: job_id, active flag ("1" add, "0" remove, "" leave), status key prefix,
+    # then field/value pairs.
+    # Returns the updated hash as a flat field/value list, or nil if the job is gone.
+    _UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local old_status = redis.call('HGET', KEYS[1], 'status')
+redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+local new_status = redis.call('HGET', KEYS[1], 'status')
+if new_status ~= old_status then
+    local created = redis.call('ZSCORE', KEYS[3], ARGV[1])
+    if old_status then
+        redis.call('ZREM', ARGV[3] .. old_status, ARGV[1])
+    end
+    if created then
+        redis.call('ZADD', ARGV[3] .. new_status, created, ARGV[1])
+    end
+end
+if ARGV[2] == '1' then
+    redis.call('SADD', KEYS[2], ARGV[1])
+elseif ARGV[2] == '0' then
+    redis.call('SREM', KEYS[2], ARGV[1])
+end
+return redis.call('HGETALL', KEYS[1])
+"""
+    
+    # Drop a job and its index entries. KEYS as above; ARGV: job_id, status key prefix.
+    # Returns 1 if the hash existed.
+    _DELETE_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status then
+    redis.call('ZREM', ARGV[2] .. status, ARGV[1])
+end
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return redis.call('DEL', KEYS[1])
+"""
+    
+    def __init__(self, url: str):
+        import redis  # Optional dependency, only needed when REDIS_URL is set
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._update_script = self._redis.register_script(self._UPDATE_SCRIPT)
+        self._delete_script = self._redis.register_script(self._DELETE_SCRIPT)
+    
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+    
+    def _script_keys(self, job_id: str) -> List[str]:
+        return [self._key(job_id), self.ACTIVE_KEY, self.ALL_KEY]
+    
+    def _load_jobs(self, job_ids: List[str]) -> List[JobStatus]:
+        """Fetch jobs in one round trip, skipping ids whose hash has expired"""
+        pipe = self._redis.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hgetall(self._key(job_id))
+        jobs = (self._from_hash(data) for data in pipe.execute())
+        return [job for job in jobs if job is not None]
+    
+    @staticmethod
+    def _from_hash(data: dict) -> Optional[JobStatus]:
+        """Build a JobStatus from a stored hash (None if the hash is missing)"""
+        if not data:
+            return None
+        return JobStatus(
+            job_id=data['job_id'],
+            status=data['status'],
+            progress=int(data['progress']),
+            message=data['message'],
+            result_path=data.get('result_path') or None,
+            error=data.get('error') or None,
+            created_at=datetime.fromisoformat(data['created_at']),
+            updated_at=datetime.fromisoformat(data['updated_at']),
+            version=int(data.get('version', 0))
+        )
+    
+    def create_job(self, job_id: str, initial_message: str = "Job created") -> JobStatus:
+        """Create a new job with initial status"""
+        status = JobStatus(
+            job_id=job_id,
+            status="uploading",
+            progress=0,
+            message=initial_message
+        )
+        pipe = self._redis.pipeline()
+        # Re-created jobs drop their old index entries first
+        self._delete_script(keys=self._script_keys(job_id), args=[job_id, self.STATUS_KEY_PREFIX], client=pipe)
+        pipe.hset(self._key(job_id), mapping={
+            "job_id": job_id,
+            "status": status.status,
+            "progress": status.progress,
+            "message": status.message,
+            "result_path": "",
+            "error": "",
+            "created_at": status.created_at.isoformat(),
+            "updated_at": status.updated_at.isoformat(),
+            "version": 0
+        })
+        # Redis drops the job once the retention time has passed
+        pipe.expire(self._key(job_id), config.JOB_RETENTION_HOURS * 3600)
+        created = status.created_at.timestamp()
+        pipe.zadd(self.ALL_KEY, {job_id: created})
+        pipe.zadd(self.STATUS_KEY_PREFIX + status.status, {job_id: created})
+        pipe.sadd(self.ACTIVE_KEY, job_id)
+        pipe.execute()
+        return status
+    
+    def update_status(
+        self,
+        job_id: str,
+        status: str = None,
+        progress: int = None,
+        message: str = None,
+        result_path: str = None,
+        error: str = None
+    ) -> Optional[JobStatus]:
+        """Update job status (same rules as StatusManager.update_status), atomically"""
+        fields = {}
+        if status is not None:
+            fields['status'] = status
+            if status in STATUS_PROGRESS:
+                fields['progress'] = STATUS_PROGRESS[status]
+        if progress is not None:
+            fields['progress'] = max(0, min(100, progress))
+        if message is not None:
+            fields['message'] = message
+        if result_path is not None:
+            fields['result_path'] = result_path
+        if error is not None:
+            fields['error'] = error
+            fields['status'] = "error"
+        fields['updated_at'] = datetime.now().isoformat()
+        
+        if 'status' not in fields:
+            active = ""
+        else:
+            active = "1" if fields['status'] in ACTIVE_STATUSES else "0"
+        
+        result = self._update_script(
+            keys=self._script_keys(job_id),
+            args=[job_id, active, self.STATUS_KEY_PREFIX, *(item for pair in fields.items() for item in pair)]
+        )
+        if result is None:
+            return None
+        return self._from_hash(dict(zip(result[::2], result[1::2])))
+    
+    def get_status(self, job_id: str) -> Optional[JobStatus]:
+        """Get current status of a job"""
+        return self._from_hash(self._redis.hgetall(self._key(job_id)))
+    
+    def get_status_json(self, job_id: str) -> Optional[Tuple[int, datetime, bytes]]:
+        """Get the serialized status of a job as (version, updated_at, JSON body)"""
+        job = self.get_status(job_id)
+        if job is None:
+            return None
+        return job.version, job.updated_at, job.to_status_json()
+    
+    def job_exists(self, job_id: str) -> bool:
+        """Check if a job exists"""
+        return bool(self._redis.exists(self._key(job_id)))
+    
+    def delete_job(self, job_id: str) -> bool:
+        """Delete a job from tracking"""
+        return bool(self._delete_script(keys=self._script_keys(job_id), args=[job_id, self.STATUS_KEY_PREFIX]))
+    
+    def cleanup_old_jobs(self, max_age_hours: int = None) -> int:
+        """
+        Remove jobs older than specified hours.
+        Job hashes expire on their own; this also drops expired ids from the indexes.
+        """
+        if max_age_hours is None:
+            max_age_hours = config.JOB_RETENTION_HOURS
+        
+        cutoff = (datetime.now() - timedelta(hours=max_age_hours)).timestamp()
+        
+        # The creation index is ordered by age, so the old jobs are a score range
+        job_ids = self._redis.zrangebyscore(self.ALL_KEY, "-inf", cutoff)
+        pipe = self._redis.pipeline(transaction=False)
+        for job_id in job_ids:
+            self._delete_script(keys=self._script_keys(job_id), args=[job_id, self.STATUS_KEY_PREFIX], client=pipe)
+        # Ids whose hash expired first are unknown to the delete script's status lookup
+        for status_key in self._redis.scan_iter(match=self.STATUS_KEY_PREFIX + "*"):
+            pipe.zremrangebyscore(status_key, "-inf", cutoff)
+        pipe.execute()
+        
+        return len(job_ids)
+    
+    def get_all_jobs(self) -> Dict[str, JobStatus]:
+        """Get all job statuses (for debugging/admin)"""
+        return {job.job_id: job for job in self._load_jobs(self._redis.zrange(self.ALL_KEY, 0, -1))}
+    
+    def snapshot_all_jobs(self) -> List[Tuple[str, JobStatus]]:
+        """Get a point-in-time list of all (job_id, status) pairs"""
+        return list(self.get_all_jobs().items())
+    
+    def get_jobs_page(self, limit: int, offset: int = 0, status: str = None) -> Tuple[int, List[JobStatus]]:
+        """
+        Get one page of jobs in creation order as (number of matching jobs, page).
+        Only the page's hashes are fetched; the index may still count a job whose hash
+        expired since the last cleanup.
+        """
+        index_key = self.ALL_KEY if status is None else self.STATUS_KEY_PREFIX + status
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zcard(index_key)
+        pipe.zrange(index_key, offset, offset + limit - 1)
+        total, job_ids = pipe.execute()
+        return total, self._load_jobs(job_ids)
+    
+    def count_active_jobs(self) -> int:
+        """Count jobs that are currently processing"""
+        return self._redis.scard(self.ACTIVE_KEY)
+
+
 # Global instance
-_status_manager = StatusManager()
+_status_manager: StatusStore = RedisStatusManager(config.REDIS_URL) if config.REDIS_URL else StatusManager()
 
 
-def get_status_manager() -> StatusManager:
-    """Get the global status manager instance"""
+def get_status_manager() -> StatusStore:
+    """Get the global status manager instance (Redis-backed when REDIS_URL is set)"""
     return _status_manager
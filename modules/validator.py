@@ -3,9 +3,9 @@ Validator Module - Handles file size checking and PDF validation
 """
 import os
 from typing import Dict, Tuple
-import psutil
 from PyPDF2 import PdfReader
 import config
+from utils.sysinfo import get_virtual_memory
 
 
 class ValidationResult:
@@ -28,7 +28,7 @@ def check_size_allowance(file_size: int) -> Dict:
     """
     try:
         # Get available RAM
-        memory = psutil.virtual_memory()
+        memory = get_virtual_memory()
         available_ram = memory.available
         
         # Calculate maximum allowed size
@@ -95,7 +95,7 @@ def validate_file_size_on_upload(file_size: int) -> ValidationResult:
         return ValidationResult(True, "Size check skipped (disabled in config)")
     
     try:
-        memory = psutil.virtual_memory()
+        memory = get_virtual_memory()
         available_ram = memory.available
         max_allowed_size = int(available_ram * config.RAM_SAFETY_MARGIN)
         
@@ -115,23 +115,73 @@ def validate_file_size_on_upload(file_size: int) -> ValidationResult:
         return ValidationResult(False, f"Error validating file size: {str(e)}")
 
 
-def validate_pdf_structure(file_path: str) -> ValidationResult:
+class PDFStreamSniffer:
+    """
+    Keeps the first and last bytes of an upload as it is written, so obvious
+    non-PDFs and truncated files can be rejected without reading the file back.
+    """
+    
+    MAGIC = b"%PDF-"
+    EOF_MARKER = b"%%EOF"
+    TAIL_SIZE = 1024  # PDF spec: %%EOF must appear within the last 1024 bytes
+    
+    def __init__(self):
+        self.head = b""
+        self.tail = bytearray()
+        self.size = 0
+    
+    def feed(self, chunk: bytes):
+        """Record one chunk of the upload"""
+        self.size += len(chunk)
+        if len(self.head) < len(self.MAGIC):
+            self.head += chunk[:len(self.MAGIC) - len(self.head)]
+        if len(chunk) >= self.TAIL_SIZE:
+            self.tail = bytearray(chunk[-self.TAIL_SIZE:])
+        else:
+            self.tail += chunk
+            del self.tail[:-self.TAIL_SIZE]
+    
+    def validate(self) -> ValidationResult:
+        """
+        Check the PDF magic and end-of-file marker.
+        Passing this doesn't make the PDF valid - validate_pdf_structure still parses it.
+        
+        Returns:
+            ValidationResult object
+        """
+        if self.size == 0:
+            return ValidationResult(False, "The uploaded file is empty")
+        
+        if self.head != self.MAGIC:
+            return ValidationResult(False, "The uploaded file is not a valid PDF")
+        
+        if self.EOF_MARKER not in self.tail:
+            return ValidationResult(False, "The PDF file is incomplete or corrupted")
+        
+        return ValidationResult(True, "PDF header and trailer present")
+
+
+def validate_pdf_structure(file_path: str, file_size: int = None) -> ValidationResult:
     """
     Validate PDF file structure and integrity.
+    The file is parsed lazily from disk: only the xref, trailer and page tree
+    are read, not the whole file.
     
     Args:
         file_path: Path to the PDF file
+        file_size: Size in bytes if already known (skips the stat)
         
     Returns:
         ValidationResult object
     """
     try:
         # Check file exists
-        if not os.path.exists(file_path):
-            return ValidationResult(False, "File not found")
+        if file_size is None:
+            if not os.path.exists(file_path):
+                return ValidationResult(False, "File not found")
+            file_size = os.path.getsize(file_path)
         
         # Check file size
-        file_size = os.path.getsize(file_path)
         if file_size == 0:
             return ValidationResult(False, "The uploaded file is empty")
         
@@ -140,29 +190,31 @@ def validate_pdf_structure(file_path: str) -> ValidationResult:
             return ValidationResult(False, "File must be a PDF")
         
         # Try to open and read PDF
+        # (PdfReader given a path reads the whole file into memory; given a file handle it seeks)
         try:
-            reader = PdfReader(file_path)
-            
-            # Check if PDF has pages
-            num_pages = len(reader.pages)
-            if num_pages == 0:
-                return ValidationResult(False, "The PDF file contains no pages")
-            
-            # Check if PDF is encrypted
-            if reader.is_encrypted:
-                return ValidationResult(
-                    False, 
-                    "The PDF is password-protected. Please upload an unencrypted file."
-                )
-            
-            # Try to access first page to ensure it's readable
-            try:
-                _ = reader.pages[0]
-            except Exception as e:
-                return ValidationResult(
-                    False,
-                    "The PDF file appears to be corrupted or damaged"
-                )
+            with open(file_path, "rb") as pdf_file:
+                reader = PdfReader(pdf_file)
+                
+                # Check if PDF has pages
+                num_pages = len(reader.pages)
+                if num_pages == 0:
+                    return ValidationResult(False, "The PDF file contains no pages")
+                
+                # Check if PDF is encrypted
+                if reader.is_encrypted:
+                    return ValidationResult(
+                        False, 
+                        "The PDF is password-protected. Please upload an unencrypted file."
+                    )
+                
+                # Try to access first page to ensure it's readable
+                try:
+                    _ = reader.pages[0]
+                except Exception as e:
+                    return ValidationResult(
+                        False,
+                        "The PDF file appears to be corrupted or damaged"
+                    )
             
             return ValidationResult(
                 True,
@@ -170,6 +222,8 @@ def validate_pdf_structure(file_path: str) -> ValidationResult:
                 data={"num_pages": num_pages, "file_size": file_size}
             )
             
+        except FileNotFoundError:
+            return ValidationResult(False, "File not found")
         except Exception as e:
             error_msg = str(e).lower()
             
@@ -2,8 +2,9 @@
 Watermark Module - Handles watermark creation and application to PDFs
 """
 import os
+from functools import lru_cache
 from io import BytesIO
-from typing import Tuple
+from typing import BinaryIO, Tuple, Union
 from PyPDF2 import PdfReader, PdfWriter
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
@@ -70,6 +71,23 @@ def create_watermark_overlay(
     return packet
 
 
+@lru_cache(maxsize=64)
+def _render_watermark_overlay(
+    text: str,
+    color: Tuple[float, float, float],
+    page_width: float,
+    page_height: float,
+    font_size: int,
+    opacity: float,
+    rotation: int
+) -> bytes:
+    """Render an overlay once per distinct text/color/page size (documents rarely mix many sizes)"""
+    return create_watermark_overlay(
+        text, color, page_width, page_height,
+        font_size=font_size, opacity=opacity, rotation=rotation
+    ).getvalue()
+
+
 def apply_watermark_to_page(page, watermark_page):
     """
     Apply a watermark to a single page.
@@ -87,21 +105,55 @@ def apply_watermark_to_page(page, watermark_page):
 
 def add_watermark_to_pdf(
     input_pdf_path: str,
-    output_pdf_path: str,
+    output_pdf_path: Union[str, BinaryIO],
     color: Tuple[float, float, float],
     watermark_text: str = None
-) -> str:
+) -> Union[str, BinaryIO]:
     """
     Add watermark to all pages of a PDF file.
     
     Args:
         input_pdf_path: Path to input PDF
-        output_pdf_path: Path to save watermarked PDF
+        output_pdf_path: Path to save watermarked PDF, or a binary file object to write it to
+        color: RGB color tuple for watermark (values 0-1)
+        watermark_text: Text for watermark (defaults to config)
+        
+    Returns:
+        output_pdf_path
+        
+    Raises:
+        Exception if watermarking fails
+    """
+    try:
+        # Read input PDF
+        reader = PdfReader(input_pdf_path)
+    except Exception as e:
+        raise Exception(f"Failed to add watermark: {str(e)}")
+    
+    return watermark_page_range(reader, 0, len(reader.pages), output_pdf_path, color, watermark_text)
+
+
+def watermark_page_range(
+    reader: PdfReader,
+    start_page: int,
+    end_page: int,
+    output_pdf_path: Union[str, BinaryIO],
+    color: Tuple[float, float, float],
+    watermark_text: str = None
+) -> Union[str, BinaryIO]:
+    """
+    Watermark pages [start_page, end_page) of an already-open PDF into a new file.
+    
+    Args:
+        reader: Reader for the source PDF
+        start_page: First page (0-based)
+        end_page: Page after the last one
+        output_pdf_path: Path to save watermarked PDF, or a binary file object to write it to
         color: RGB color tuple for watermark (values 0-1)
         watermark_text: Text for watermark (defaults to config)
         
     Returns:
-        Path to output PDF
+        output_pdf_path
         
     Raises:
         Exception if watermarking fails
@@ -110,12 +162,11 @@ def add_watermark_to_pdf(
         if watermark_text is None:
             watermark_text = config.WATERMARK_TEXT
         
-        # Read input PDF
-        reader = PdfReader(input_pdf_path)
         writer = PdfWriter()
+        watermark_pages = {}  # (width, height) -> parsed overlay page, shared by same-size pages
         
         # Process each page
-        for page_num in range(len(reader.pages)):
+        for page_num in range(start_page, end_page):
             page = reader.pages[page_num]
             
             # Get page dimensions
@@ -123,24 +174,31 @@ def add_watermark_to_pdf(
             page_width = float(page_box.width)
             page_height = float(page_box.height)
             
-            # Create watermark overlay for this page size
-            watermark_buffer = create_watermark_overlay(
-                watermark_text,
-                color,
-                page_width,
-                page_height
-            )
+            # Get the watermark overlay for this page size
+            watermark_page = watermark_pages.get((page_width, page_height))
+            if watermark_page is None:
+                watermark_buffer = BytesIO(_render_watermark_overlay(
+                    watermark_text,
+                    tuple(color),
+                    page_width,
+                    page_height,
+                    config.WATERMARK_FONT_SIZE,
+                    config.WATERMARK_OPACITY,
+                    config.WATERMARK_ROTATION
+                ))
+                watermark_page = PdfReader(watermark_buffer).pages[0]
+                watermark_pages[(page_width, page_height)] = watermark_page
             
             # Apply watermark
-            watermark_reader = PdfReader(watermark_buffer)
-            watermark_page = watermark_reader.pages[0]
-            
             page.merge_page(watermark_page)
             writer.add_page(page)
         
         # Write output PDF
-        with open(output_pdf_path, 'wb') as output_file:
-            writer.write(output_file)
+        if isinstance(output_pdf_path, str):
+            with open(output_pdf_path, 'wb') as output_file:
+                writer.write(output_file)
+        else:
+            writer.write(output_pdf_path)
         
         return output_pdf_path
         
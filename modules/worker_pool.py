@@ -0,0 +1,193 @@
+"""
+Worker Pool Module - Runs PDF processing jobs in a shared process pool
+"""
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Set
+import config
+from modules.processor import process_pdf_with_watermarks
+from utils.logger import get_logger
+
+logger = get_logger("watermarks.pool")
+
+
+# Workers are started from a forkserver, not forked from the (multi-threaded)
+# server process, so they can't inherit a lock held by another thread.
+_mp_context = multiprocessing.get_context("forkserver")
+_mp_context.set_forkserver_preload(["modules.worker_pool"])
+
+# Event queue used by worker processes to report progress to the parent.
+# Events are tuples: (job_id, kind, payload, detail)
+#   ("status", status_name, progress)   - progress update (sent from the worker)
+#   ("finished", result_path, None)     - job completed (sent from the future's result)
+#   ("error", error_kind, message)      - job failed (error_kind: memory, timeout, failed, crashed)
+#   ("requeue", None, None)             - job never started before the pool broke
+_event_queue = None
+
+
+def _init_worker(event_queue):
+    """Process pool initializer - stores the event queue in the worker process"""
+    global _event_queue
+    _event_queue = event_queue
+
+
+def run_job(job_id: str, input_pdf_path: str, chunk_size: int) -> tuple:
+    """
+    Process a single job inside a worker process.
+    Progress is reported through the event queue; the terminal event is
+    returned as the future's result.
+
+    Args:
+        job_id: Job identifier
+        input_pdf_path: Path to uploaded PDF
+        chunk_size: Pages per chunk
+
+    Returns:
+        (kind, payload, detail) terminal event
+    """
+    def status_callback(status, progress=None):
+        _event_queue.put((job_id, "status", status, progress))
+
+    try:
+        result_path = process_pdf_with_watermarks(
+            input_pdf_path=input_pdf_path,
+            chunk_size=chunk_size,
+            job_id=job_id,
+            status_callback=status_callback
+        )
+        return ("finished", result_path, None)
+    except MemoryError as e:
+        return ("error", "memory", str(e))
+    except TimeoutError as e:
+        return ("error", "timeout", str(e))
+    except Exception as e:
+        return ("error", "failed", str(e))
+
+
+class JobWorkerPool:
+    """
+    Shared process pool for CPU-bound PDF processing.
+    Each job runs in its own worker process (no GIL contention between jobs);
+    a drain thread in the parent applies worker events via the on_event callback.
+    Jobs are only submitted while a worker is free (see has_free_slot), so a
+    submitted job is always running rather than waiting in the executor.
+    """
+
+    def __init__(self, on_event: Callable[[str, str, object, object], None], max_workers: Optional[int] = None):
+        self._on_event = on_event
+        self._max_workers = max_workers or config.JOB_WORKERS
+        self._events = _mp_context.Queue()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}  # job_id -> future, until its terminal event is applied
+        self._started: Set[str] = set()  # in-flight jobs that have reported progress
+
+        self._drain_thread = threading.Thread(target=self._drain_events, daemon=True, name="JobEvents")
+        self._drain_thread.start()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Get the process pool, creating it on first use (or after a worker crash)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=_mp_context,
+                initializer=_init_worker,
+                initargs=(self._events,)
+            )
+        return self._executor
+
+    @property
+    def max_workers(self) -> int:
+        """Number of jobs that can run at once"""
+        return self._max_workers
+
+    def in_flight_count(self) -> int:
+        """Number of jobs currently running in the pool"""
+        with self._lock:
+            return len(self._in_flight)
+
+    def has_free_slot(self) -> bool:
+        """True if a worker is free to start another job"""
+        return self.in_flight_count() < self._max_workers
+
+    def submit(self, job: dict):
+        """
+        Submit a job popped from the queue for processing.
+
+        Args:
+            job: Job dict from queue (job_id, file_path, chunk_size)
+        """
+        self._submit(job['job_id'], run_job, job['job_id'], job['file_path'], job['chunk_size'])
+
+    def _submit(self, job_id: str, fn, *args):
+        """Submit fn(*args) as the work for job_id"""
+        with self._lock:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args)
+            self._in_flight[job_id] = future
+        future.add_done_callback(lambda f: self._on_done(job_id, executor, f))
+
+    def _on_done(self, job_id: str, executor: ProcessPoolExecutor, future: Future):
+        """Forward the job's terminal event (or its loss) to the drain thread"""
+        if future.cancelled():
+            self._events.put((job_id, "lost", "cancelled", None))
+            return
+
+        exc = future.exception()
+        if exc is None:
+            kind, payload, detail = future.result()
+            self._events.put((job_id, kind, payload, detail))
+            return
+
+        if isinstance(exc, BrokenProcessPool):
+            # A worker died (OOM kill, segfault, ...) - replace the broken pool
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+
+        self._events.put((job_id, "lost", type(exc).__name__, str(exc)))
+
+    def _drain_events(self):
+        """Apply events from worker processes (runs in a daemon thread)"""
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            try:
+                self._apply_event(*event)
+            except Exception as e:
+                logger.exception("❌ [POOL] Error handling worker event %s: %s", event[:2], e)
+
+    def _apply_event(self, job_id: str, kind: str, payload, detail):
+        """Apply one event, ignoring anything for jobs that already finished"""
+        with self._lock:
+            if job_id not in self._in_flight:
+                return  # Late progress update for a job that already reported its result
+            if kind == "status":
+                self._started.add(job_id)
+            else:
+                del self._in_flight[job_id]
+                started = job_id in self._started
+                self._started.discard(job_id)
+
+        if kind == "lost":
+            if started:
+                kind, payload = "error", "crashed"
+            else:
+                # Never started running - safe to give it back to the queue
+                kind, payload, detail = "requeue", None, None
+
+        self._on_event(job_id, kind, payload, detail)
+
+    def shutdown(self, wait: bool = True):
+        """Shut down the pool (waits for in-flight jobs by default)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+        self._events.put(None)
+        if wait:
+            self._drain_thread.join()
@@ -18,6 +18,14 @@ class TestHealthEndpoints:
         assert data["service"] == "WaterMarks Backend"
         assert data["status"] == "online"
     
+    def test_ping_endpoint(self, client):
+        """Test ping endpoint"""
+        response = client.get("/ping")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["pong"] is True
+        assert isinstance(data["timestamp"], float)
+    
     def test_health_endpoint(self, client):
         """Test health check endpoint"""
         response = client.get("/health")
@@ -175,6 +183,83 @@ class TestUploadEndpoint:
         
         assert response.status_code == 400
         assert "pdf" in response.json()["detail"].lower()
+    
+    def test_upload_rejected_by_content_length(self, client, monkeypatch):
+        """Test oversize uploads get 413 from Content-Length, before the body is read"""
+        import config
+        monkeypatch.setattr(config, "ABSOLUTE_MAX_FILE_SIZE", 1024)
+        
+        response = client.post(
+            "/api/upload",
+            files={"file": ("test.pdf", BytesIO(b"%PDF-1.4" + b"0" * (200 * 1024)), "application/pdf")},
+            data={"chunk_size": 5}
+        )
+        
+        assert response.status_code == 413
+        assert "too large" in response.json()["detail"].lower()
+    
+    def test_rejected_upload_leaves_no_file(self, client, valid_pdf_1_page, monkeypatch):
+        """Test that an upload rejected by the queue removes its file from disk"""
+        import app as app_module
+        import config
+        monkeypatch.setattr(
+            app_module.queue_manager,
+            "can_accept_job",
+            lambda *args, **kwargs: (False, "Server memory insufficient.", {"retry_after_seconds": 60, "reason": "memory"})
+        )
+        before = set(os.listdir(config.UPLOAD_DIR))
+        
+        with open(valid_pdf_1_page, "rb") as f:
+            response = client.post(
+                "/api/upload",
+                files={"file": ("test.pdf", f, "application/pdf")},
+                data={"chunk_size": 5}
+            )
+        
+        assert response.status_code == 503
+        assert response.json()["detail"]["reason"] == "memory"
+        assert set(os.listdir(config.UPLOAD_DIR)) == before
+
+
+class TestStreamUploadEndpoint:
+    """Tests for raw-body stream upload endpoint"""
+
+    def test_stream_upload_valid_pdf(self, client, valid_pdf_1_page):
+        """Test uploading valid PDF as raw request body"""
+        with open(valid_pdf_1_page, "rb") as f:
+            response = client.post(
+                "/api/upload-stream",
+                content=f.read(),
+                headers={"X-Filename": "test.pdf", "X-Chunk-Size": "5"}
+            )
+
+        assert response.status_code == 200
+        assert len(response.json()["job_id"]) > 0
+
+    def test_stream_upload_non_pdf_file(self, client):
+        """Test stream upload rejects non-PDF filenames"""
+        response = client.post(
+            "/api/upload-stream",
+            content=b"This is not a PDF",
+            headers={"X-Filename": "test.txt"}
+        )
+
+        assert response.status_code == 400
+        assert "pdf" in response.json()["detail"].lower()
+
+    def test_stream_upload_too_large(self, client, valid_pdf_1_page, monkeypatch):
+        """Test stream upload aborts once the size limit is exceeded"""
+        import config
+        monkeypatch.setattr(config, "ABSOLUTE_MAX_FILE_SIZE", 100)
+
+        with open(valid_pdf_1_page, "rb") as f:
+            response = client.post(
+                "/api/upload-stream",
+                content=f.read(),
+                headers={"X-Filename": "test.pdf"}
+            )
+
+        assert response.status_code == 413
 
 
 class TestStatusEndpoint:
@@ -206,6 +291,30 @@ class TestStatusEndpoint:
             # If there's an error, it should still be a valid error response
             assert response.status_code in [404, 500]
     
+    def test_unchanged_status_returns_not_modified(self, client):
+        """Test ETag / If-None-Match handling for processing statuses"""
+        import app as app_module
+        from utils.helpers import generate_job_id
+        
+        job_id = generate_job_id()
+        app_module.status_manager.create_job(job_id)
+        try:
+            response = client.get(f"/api/status/{job_id}")
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert int(response.headers["x-poll-interval"]) >= 1
+            
+            response = client.get(f"/api/status/{job_id}", headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            
+            app_module.status_manager.update_status(job_id, status="splitting")
+            response = client.get(f"/api/status/{job_id}", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] != etag
+            assert response.json()["status"] == "splitting"
+        finally:
+            app_module.status_manager.delete_job(job_id)
+    
     def test_get_status_for_nonexistent_job(self, client):
         """Test getting status for non-existent job"""
         response = client.get("/api/status/nonexistent-job-id")
@@ -237,6 +346,28 @@ class TestDownloadEndpoint:
         elif response.status_code == 200:
             assert response.headers["content-type"] == "application/pdf"
     
+    def test_download_with_accel_redirect(self, client, tmp_path, monkeypatch):
+        """Test downloads hand off to the reverse proxy when configured"""
+        import app as app_module
+        import config
+        from utils.helpers import generate_job_id
+        monkeypatch.setattr(config, "DOWNLOAD_ACCEL_REDIRECT_PREFIX", "/_internal/outputs")
+        
+        job_id = generate_job_id()
+        result_path = tmp_path / f"watermarked_{job_id}.pdf"
+        result_path.write_bytes(b"%PDF-1.4 test")
+        app_module.status_manager.create_job(job_id)
+        app_module.status_manager.update_status(job_id, status="finished", result_path=str(result_path))
+        try:
+            response = client.get(f"/api/download/{job_id}")
+            assert response.status_code == 200
+            assert response.headers["x-accel-redirect"] == f"/_internal/outputs/watermarked_{job_id}.pdf"
+            assert response.content == b""
+            # nginx reads the file after the response, so the job must outlive it
+            assert app_module.status_manager.get_status(job_id) is not None
+        finally:
+            app_module.status_manager.delete_job(job_id)
+    
     def test_download_nonexistent_job(self, client):
         """Test downloading non-existent job"""
         response = client.get("/api/download/nonexistent-job-id")
@@ -284,6 +415,43 @@ class TestAdminEndpoints:
         assert "active_jobs" in data
         assert "jobs" in data
     
+    def test_list_jobs_paginated(self, client):
+        """Test limit/offset/status filtering of the job listing"""
+        import app as app_module
+        
+        job_ids = [f"admin-page-{i}" for i in range(3)]
+        for job_id in job_ids:
+            app_module.status_manager.create_job(job_id)
+        app_module.status_manager.update_status(job_ids[1], status="merging")
+        try:
+            data = client.get("/api/admin/jobs", params={"limit": 1, "status": "merging"}).json()
+            assert data["total_jobs"] == 1
+            assert list(data["jobs"]) == [job_ids[1]]
+            assert data["jobs"][job_ids[1]]["progress"] == 80
+            
+            data = client.get("/api/admin/jobs", params={"limit": 2}).json()
+            assert len(data["jobs"]) <= 2
+            assert data["limit"] == 2
+        finally:
+            for job_id in job_ids:
+                app_module.status_manager.delete_job(job_id)
+    
+    def test_large_listing_is_gzipped(self, client):
+        """Test JSON responses above the size threshold are compressed"""
+        import app as app_module
+        
+        job_ids = [f"admin-gzip-{i}" for i in range(10)]
+        for job_id in job_ids:
+            app_module.status_manager.create_job(job_id)
+        try:
+            response = client.get("/api/admin/jobs", headers={"Accept-Encoding": "gzip"})
+            assert response.status_code == 200
+            assert response.headers.get("content-encoding") == "gzip"
+            assert response.json()["total_jobs"] >= 10
+        finally:
+            for job_id in job_ids:
+                app_module.status_manager.delete_job(job_id)
+    
     def test_cleanup_old_jobs(self, client):
         """Test cleanup old jobs endpoint"""
         response = client.post("/api/admin/cleanup-old")
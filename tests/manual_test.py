@@ -384,7 +384,7 @@ def main():
     try:
         response = requests.get(f"{BASE_URL}/health", timeout=3)
         print_success("Server is online!")
-    except:
+    except requests.RequestException:
         print_error("Server is not reachable!")
         print_info("Please start the server first: python app.py")
         sys.exit(1)
@@ -5,113 +5,101 @@ import pytest
 import os
 import tempfile
 from PyPDF2 import PdfReader
+from functools import partial
 from modules.processor import (
-    split_pdf_into_chunks,
-    merge_chunks,
-    ChunkInfo
+    plan_chunks,
+    process_single_chunk,
+    process_pdf_with_watermarks,
+    ChunkInfo,
+    _chunk_worker_count,
+    _make_chunk_executor
 )
 
 
-class TestPDFSplitting:
-    """Tests for PDF splitting functionality"""
+class TestChunkPlanning:
+    """Tests for page-range chunk planning"""
     
-    def test_split_single_page_pdf(self, valid_pdf_1_page):
-        """Test splitting a single-page PDF"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            chunks = split_pdf_into_chunks(valid_pdf_1_page, chunk_size=5, output_dir=temp_dir)
-            
-            assert len(chunks) == 1
-            assert chunks[0].start_page == 0
-            assert chunks[0].end_page == 1
-            assert os.path.exists(chunks[0].input_path)
-    
-    def test_split_10_page_pdf_into_3_page_chunks(self, valid_pdf_10_pages):
-        """Test splitting 10-page PDF with chunk_size=3"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            chunks = split_pdf_into_chunks(valid_pdf_10_pages, chunk_size=3, output_dir=temp_dir)
-            
-            # Should create 4 chunks: 3+3+3+1
-            assert len(chunks) == 4
-            
-            # Verify first chunk
-            assert chunks[0].start_page == 0
-            assert chunks[0].end_page == 3
-            
-            # Verify last chunk
-            assert chunks[3].start_page == 9
-            assert chunks[3].end_page == 10
-            
-            # Verify all chunks exist
-            for chunk in chunks:
-                assert os.path.exists(chunk.input_path)
+    def test_plan_chunks_page_ranges(self, valid_pdf_10_pages):
+        """Test chunks cover every page once, in order, without writing files"""
+        chunks = plan_chunks(valid_pdf_10_pages, total_pages=10, chunk_size=3)
+        
+        assert [(c.start_page, c.end_page) for c in chunks] == [(0, 3), (3, 6), (6, 9), (9, 10)]
+        assert all(c.input_path == valid_pdf_10_pages for c in chunks)
+        assert chunks[0].color != chunks[1].color
+
+
+class TestParallelWatermarking:
+    """Tests for parallel chunk watermarking"""
     
-    def test_split_with_large_chunk_size(self, valid_pdf_5_pages):
-        """Test splitting with chunk_size larger than total pages"""
+    @pytest.mark.parametrize("min_chunks", [1, 100])
+    def test_watermark_chunks_in_order(self, valid_pdf_10_pages, monkeypatch, min_chunks):
+        """Test chunks come back watermarked and in order (process pool and thread fallback)"""
+        import config
+        monkeypatch.setattr(config, "CHUNK_PROCESS_MIN_CHUNKS", min_chunks)
+        monkeypatch.setattr(os, "cpu_count", lambda: 4)
+        
         with tempfile.TemporaryDirectory() as temp_dir:
-            chunks = split_pdf_into_chunks(valid_pdf_5_pages, chunk_size=100, output_dir=temp_dir)
+            chunks = plan_chunks(valid_pdf_10_pages, total_pages=10, chunk_size=2)
+            with _make_chunk_executor(2, len(chunks)) as executor:
+                processed = list(executor.map(partial(process_single_chunk, output_dir=temp_dir), chunks))
             
-            # Should create only 1 chunk containing all pages
-            assert len(chunks) == 1
-            assert chunks[0].start_page == 0
-            assert chunks[0].end_page == 5
+            assert [chunk.chunk_id for chunk in processed] == list(range(5))
+            for chunk in processed:
+                assert chunk.status == "completed"
+                assert len(PdfReader(chunk.output_path).pages) == 2
+
     
-    def test_chunks_have_colors(self, valid_pdf_10_pages):
-        """Test that chunks are assigned colors"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            chunks = split_pdf_into_chunks(valid_pdf_10_pages, chunk_size=3, output_dir=temp_dir)
-            
-            for chunk in chunks:
-                assert chunk.color is not None
-                assert len(chunk.color) == 3  # RGB tuple
-                assert all(0 <= c <= 1 for c in chunk.color)
+    @pytest.mark.parametrize("max_workers,chunk_count,expected", [
+        (32, 2, 2),     # Capped by chunks
+        (32, 100, 8),   # Capped by cores
+        (3, 100, 3),    # Configured limit
+        (None, 0, 1),   # Always at least one
+    ])
+    def test_chunk_worker_count(self, monkeypatch, max_workers, chunk_count, expected):
+        """Test worker count is capped by chunks, cores and the configured limit"""
+        import config
+        monkeypatch.setattr(config, "MAX_PARALLEL_WORKERS", 4)
+        monkeypatch.setattr(os, "cpu_count", lambda: 8)
+        assert _chunk_worker_count(max_workers, chunk_count) == expected
     
-    def test_chunks_maintain_order(self, valid_pdf_10_pages):
-        """Test that chunks maintain their order"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            chunks = split_pdf_into_chunks(valid_pdf_10_pages, chunk_size=2, output_dir=temp_dir)
-            
-            for i, chunk in enumerate(chunks):
-                assert chunk.order == i
-                assert chunk.chunk_id == i
+    def test_process_chunk_in_memory(self, valid_pdf_10_pages):
+        """Test a chunk processed without an output dir is returned as bytes"""
+        from io import BytesIO
+        chunk = plan_chunks(valid_pdf_10_pages, total_pages=10, chunk_size=4)[1]
+        
+        processed = process_single_chunk(chunk)
+        
+        assert processed.status == "completed"
+        assert processed.output_path is None
+        assert len(PdfReader(BytesIO(processed.output_bytes)).pages) == 4
 
 
-class TestPDFMerging:
-    """Tests for PDF merging functionality"""
-    
-    def test_merge_single_chunk(self, valid_pdf_1_page):
-        """Test merging a single chunk"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            output_path = os.path.join(temp_dir, "merged.pdf")
-            
-            merge_chunks([valid_pdf_1_page], output_path)
-            
-            assert os.path.exists(output_path)
-            
-            # Verify merged PDF
-            reader = PdfReader(output_path)
-            assert len(reader.pages) == 1
+class TestProcessPipeline:
+    """Tests for the plan -> watermark -> merge pipeline"""
     
-    def test_merge_multiple_chunks(self, valid_pdf_1_page):
-        """Test merging multiple chunks"""
+    @pytest.mark.parametrize("in_memory_limit", [0, 1024 * 1024 * 1024])
+    def test_process_pdf_keeps_page_order(self, valid_pdf_10_pages, monkeypatch, in_memory_limit):
+        """Test the merged output has every page, in order, and progress ends at finished"""
+        import config
+        monkeypatch.setattr(config, "IN_MEMORY_CHUNKS_MAX_FILE_SIZE", in_memory_limit)
         with tempfile.TemporaryDirectory() as temp_dir:
-            # Use same PDF multiple times as chunks
-            output_path = os.path.join(temp_dir, "merged.pdf")
-            
-            merge_chunks([valid_pdf_1_page, valid_pdf_1_page, valid_pdf_1_page], output_path)
+            monkeypatch.setattr(config, "PROCESSING_DIR", os.path.join(temp_dir, "processing"))
+            monkeypatch.setattr(config, "OUTPUT_DIR", os.path.join(temp_dir, "outputs"))
+            updates = []
             
-            assert os.path.exists(output_path)
+            output_path = process_pdf_with_watermarks(
+                valid_pdf_10_pages,
+                chunk_size=3,
+                job_id="pipeline-test",
+                status_callback=lambda status, progress=None: updates.append((status, progress))
+            )
             
-            # Verify merged PDF has 3 pages
             reader = PdfReader(output_path)
-            assert len(reader.pages) == 3
-    
-    def test_merge_nonexistent_chunk_fails(self):
-        """Test that merging non-existent chunks fails"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            output_path = os.path.join(temp_dir, "merged.pdf")
-            
-            with pytest.raises(Exception):
-                merge_chunks(["/nonexistent/file.pdf"], output_path)
+            source = PdfReader(valid_pdf_10_pages)
+            assert len(reader.pages) == len(source.pages)
+            for merged_page, source_page in zip(reader.pages, source.pages):
+                assert source_page.extract_text().strip() in merged_page.extract_text()
+            assert updates[-1] == ("finished", None)
 
 
 class TestChunkInfo:
@@ -0,0 +1,170 @@
+"""
+Unit tests for queue manager module
+"""
+import os
+import pytest
+import config
+from modules.queue_manager import JobQueueManager
+
+
+class TestQueuePersistence:
+    """Tests for the queue snapshot and its write-ahead log"""
+
+    @pytest.fixture
+    def queue_file(self, tmp_path):
+        """Path for a fresh queue snapshot"""
+        return str(tmp_path / "queue.json")
+
+    @staticmethod
+    def _add(manager, job_id):
+        manager.add_job(job_id, "session", f"/tmp/{job_id}.pdf", 1024, 10)
+
+    def test_changes_replayed_from_wal(self, queue_file):
+        """Jobs written only to the WAL are restored on restart"""
+        manager = JobQueueManager(queue_file)
+        self._add(manager, "job-a")
+        self._add(manager, "job-b")
+        self._add(manager, "job-c")
+        manager.pop_next_job()
+        manager.mark_finished("job-a")
+        manager.delete_job("job-c")
+        manager.flush()
+
+        assert not os.path.exists(queue_file)
+        restored = JobQueueManager(queue_file)
+        assert set(restored.jobs) == {"job-a", "job-b"}
+        assert restored.jobs["job-a"]["status"] == "finished"
+        assert restored.get_queue_position("job-b") == 1
+
+    def test_compact_folds_wal_into_snapshot(self, queue_file, monkeypatch):
+        """Compaction rewrites the snapshot and empties the WAL"""
+        monkeypatch.setattr(config, "QUEUE_WAL_MAX_BYTES", 0)
+        manager = JobQueueManager(queue_file)
+        self._add(manager, "job-a")
+        manager.flush()
+        manager.compact()
+
+        assert os.path.getsize(f"{queue_file}.wal") == 0
+        restored = JobQueueManager(queue_file)
+        assert set(restored.jobs) == {"job-a"}
+
+    def test_records_in_snapshot_not_replayed(self, queue_file, monkeypatch):
+        """WAL records left behind by a crash before truncation don't roll the snapshot back"""
+        monkeypatch.setattr(config, "QUEUE_WAL_MAX_BYTES", 0)
+        manager = JobQueueManager(queue_file)
+        self._add(manager, "job-a")
+        manager.flush()
+        with open(f"{queue_file}.wal") as f:
+            stale_wal = f.read()
+        manager.delete_job("job-a")
+        manager.compact()
+        with open(f"{queue_file}.wal", "w") as f:
+            f.write(stale_wal)
+
+        restored = JobQueueManager(queue_file)
+        assert "job-a" not in restored.jobs
+
+    def test_torn_wal_record_ignored(self, queue_file):
+        """A partial last line (crash mid-append) doesn't lose earlier records"""
+        manager = JobQueueManager(queue_file)
+        self._add(manager, "job-a")
+        manager.flush()
+        with open(f"{queue_file}.wal", "a") as f:
+            f.write('{"op":"put","job":{"job_id"')
+
+        restored = JobQueueManager(queue_file)
+        assert set(restored.jobs) == {"job-a"}
+
+
+class TestExpiryCleanup:
+    """Tests for deadline-driven cleanup of expired jobs"""
+
+    @pytest.fixture
+    def manager(self, tmp_path):
+        """Queue manager with one finished job"""
+        manager = JobQueueManager(str(tmp_path / "queue.json"))
+        manager.add_job("job-a", "session", str(tmp_path / "job-a.pdf"), 1024, 10)
+        manager.pop_next_job()
+        manager.mark_finished("job-a")
+        return manager
+
+    def test_finished_job_kept_during_download_window(self, manager):
+        """A finished job survives cleanup until its download window closes"""
+        manager.cleanup_expired_jobs()
+        assert "job-a" in manager.jobs
+
+    def test_downloaded_job_removed(self, manager):
+        """A downloaded job is due immediately"""
+        manager.mark_downloaded("job-a")
+        manager.cleanup_expired_jobs()
+        assert "job-a" not in manager.jobs
+
+    def test_expired_processing_job_releases_usage(self, tmp_path):
+        """An expiring job that is still processing is removed and its usage released"""
+        manager = JobQueueManager(str(tmp_path / "queue.json"))
+        manager.add_job("job-a", "session", str(tmp_path / "job-a.pdf"), 1024, 10)
+        job = manager.pop_next_job()
+        with manager.lock:
+            job['download_window_expires_ts'] = 0
+            manager._schedule_expiry(job)
+
+        manager.cleanup_expired_jobs()
+        assert "job-a" not in manager.jobs
+        assert manager.get_active_resource_usage() == {'ram_used': 0, 'disk_used': 0, 'active_count': 0}
+    
+    def test_expired_window_restored_from_disk(self, manager):
+        """Deadlines of jobs loaded from disk are scheduled too"""
+        manager.jobs["job-a"]["download_window_expires_ts"] = 0
+        manager._mark_dirty("job-a")
+        manager.flush()
+
+        restored = JobQueueManager(manager.queue_file)
+        restored.cleanup_expired_jobs()
+        assert "job-a" not in restored.jobs
+
+
+class TestResourceUsage:
+    """Tests for the running totals of active job resources"""
+
+    def test_usage_follows_processing_jobs(self, tmp_path):
+        """Estimated usage grows when a job starts and is released when it finishes"""
+        manager = JobQueueManager(str(tmp_path / "queue.json"))
+        manager.add_job("job-a", "session", str(tmp_path / "job-a.pdf"), 1024, 10)
+        assert manager.get_active_resource_usage()['active_count'] == 0
+
+        manager.pop_next_job()
+        usage = manager.get_active_resource_usage()
+        assert usage['active_count'] == 1
+        assert usage['ram_used'] == int(1024 * config.RAM_USAGE_MULTIPLIER)
+        assert usage['disk_used'] == int(1024 * config.DISK_USAGE_MULTIPLIER)
+
+        manager.mark_finished("job-a")
+        assert manager.get_active_resource_usage() == {'ram_used': 0, 'disk_used': 0, 'active_count': 0}
+
+    def test_available_ram_counts_worker_processes(self, monkeypatch):
+        """Worker process RSS counts against the container limit alongside our own"""
+        import modules.queue_manager as queue_manager
+        monkeypatch.setattr(queue_manager, "get_process_rss", lambda: 100 * 1024 * 1024)
+        monkeypatch.setattr(queue_manager, "get_children_rss", lambda: 200 * 1024 * 1024)
+        assert queue_manager.get_effective_available_ram() == queue_manager.RENDER_CONTAINER_LIMIT - 300 * 1024 * 1024
+
+
+class TestAverageProcessingTime:
+    """Tests for the rolling average of job processing times"""
+
+    def test_average_of_recent_jobs(self, tmp_path):
+        """Average covers the last 10 completed jobs and survives their cleanup"""
+        manager = JobQueueManager(str(tmp_path / "queue.json"))
+        assert manager.get_average_processing_time() is None
+
+        for i in range(12):
+            job_id = f"job-{i}"
+            manager.add_job(job_id, "session", str(tmp_path / f"{job_id}.pdf"), 1024, 10)
+            manager.pop_next_job()
+            # Jobs 0-1 took 1000s, the last 10 took 10s each
+            manager.jobs[job_id]['started_at_ts'] -= 1000 if i < 2 else 10
+            manager.mark_finished(job_id)
+            manager.mark_downloaded(job_id)
+        manager.cleanup_expired_jobs()
+
+        assert 10 <= manager.get_average_processing_time() <= 11
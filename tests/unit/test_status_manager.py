@@ -1,6 +1,7 @@
 """
 Unit tests for status manager module
 """
+import json
 import pytest
 import time
 from datetime import datetime, timedelta
@@ -164,6 +165,16 @@ class TestStatusManager:
         assert "job-1" in all_jobs
         assert "job-2" in all_jobs
     
+    def test_snapshot_all_jobs(self, manager):
+        """Test the snapshot is unaffected by jobs created afterwards"""
+        manager.create_job("job-1")
+        
+        snapshot = manager.snapshot_all_jobs()
+        manager.create_job("job-2")
+        
+        assert [job_id for job_id, _ in snapshot] == ["job-1"]
+        assert "job-2" in manager.get_all_jobs()  # The view is live
+    
     def test_cleanup_old_jobs(self, manager):
         """Test cleaning up old jobs"""
         # Create a job
@@ -179,6 +190,34 @@ class TestStatusManager:
         assert count == 1
         assert not manager.job_exists("job-1")
     
+    def test_cleanup_stops_at_first_recent_job(self, manager):
+        """Test cleanup removes the old prefix and keeps newer jobs"""
+        for job_id in ("job-1", "job-2", "job-3"):
+            manager.create_job(job_id)
+        for job_id in ("job-1", "job-2"):
+            manager._statuses[job_id].created_at = datetime.now() - timedelta(hours=5)
+        
+        assert manager.cleanup_old_jobs(max_age_hours=1) == 2
+        assert list(manager.get_all_jobs()) == ["job-3"]
+    
+    def test_status_json_cached_until_update(self, manager):
+        """Test that the serialized status is reused until the job changes"""
+        manager.create_job("job-1")
+        
+        version, _, first = manager.get_status_json("job-1")
+        assert manager.get_status_json("job-1")[2] is first
+        assert json.loads(first)['status'] == "uploading"
+        
+        manager.update_status("job-1", status="splitting")
+        
+        new_version, _, updated = manager.get_status_json("job-1")
+        assert new_version == version + 1
+        assert updated is not first
+        assert json.loads(updated)['status'] == "splitting"
+        assert json.loads(updated)['progress'] == 30
+        
+        assert manager.get_status_json("missing") is None
+    
     def test_thread_safety(self, manager):
         """Test thread-safe operations"""
         import threading
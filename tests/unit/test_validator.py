@@ -9,7 +9,8 @@ from modules.validator import (
     validate_file_size_on_upload,
     validate_pdf_structure,
     format_bytes,
-    ValidationResult
+    ValidationResult,
+    PDFStreamSniffer
 )
 
 
@@ -96,6 +97,38 @@ class TestFileValidation:
         assert 'empty' in result.message.lower()
 
 
+class TestPDFStreamSniffer:
+    """Tests for head/tail sniffing during upload"""
+    
+    def _sniff(self, path, chunk_size=100):
+        sniffer = PDFStreamSniffer()
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                sniffer.feed(chunk)
+        return sniffer.validate()
+    
+    def test_valid_pdf_passes(self, valid_pdf_10_pages):
+        """Test a complete PDF passes regardless of chunking"""
+        assert self._sniff(valid_pdf_10_pages).is_valid
+        assert self._sniff(valid_pdf_10_pages, chunk_size=4096).is_valid
+    
+    def test_truncated_pdf_rejected(self, corrupted_pdf):
+        """Test a PDF missing its %%EOF trailer is rejected"""
+        result = self._sniff(corrupted_pdf)
+        assert not result.is_valid
+        assert "corrupt" in result.message.lower()
+    
+    def test_fake_pdf_rejected(self, fake_pdf):
+        """Test a non-PDF file is rejected by its header"""
+        assert not self._sniff(fake_pdf).is_valid
+    
+    def test_empty_rejected(self):
+        """Test an empty upload is rejected"""
+        result = PDFStreamSniffer().validate()
+        assert not result.is_valid
+        assert "empty" in result.message.lower()
+
+
 class TestFormatBytes:
     """Tests for format_bytes utility"""
     
@@ -0,0 +1,89 @@
+"""
+Unit tests for worker pool module
+"""
+import os
+import shutil
+import threading
+import pytest
+from modules import worker_pool
+from modules.worker_pool import JobWorkerPool
+
+
+def _crash_job(job_id):
+    """Report progress, then kill the worker process like the OOM killer would"""
+    worker_pool._event_queue.put((job_id, "status", "splitting", 30))
+    worker_pool._event_queue.close()
+    worker_pool._event_queue.join_thread()
+    os._exit(1)
+
+
+class TestJobWorkerPool:
+    """Tests for JobWorkerPool"""
+
+    @pytest.fixture
+    def events(self):
+        """Collected worker events plus a flag set on the final event"""
+        collected = []
+        done = threading.Event()
+
+        def on_event(job_id, kind, payload, detail):
+            collected.append((job_id, kind, payload, detail))
+            if kind in ("finished", "error", "requeue"):
+                done.set()
+
+        return collected, done, on_event
+
+    def test_job_reports_progress_then_finished(self, events, valid_pdf_1_page, tmp_path):
+        """Test that a job reports status updates followed by its result"""
+        collected, done, on_event = events
+        input_path = str(tmp_path / "input.pdf")
+        shutil.copy(valid_pdf_1_page, input_path)
+
+        pool = JobWorkerPool(on_event=on_event, max_workers=1)
+        try:
+            pool.submit({"job_id": "pool-test-1", "file_path": input_path, "chunk_size": 5})
+            assert done.wait(timeout=60)
+        finally:
+            pool.shutdown()
+
+        kinds = [event[1] for event in collected]
+        assert "status" in kinds
+        assert kinds[-1] == "finished"
+        assert os.path.exists(collected[-1][2])
+        os.remove(collected[-1][2])
+
+    def test_job_error_is_reported(self, events, tmp_path):
+        """Test that a failing job reports an error event"""
+        collected, done, on_event = events
+
+        pool = JobWorkerPool(on_event=on_event, max_workers=1)
+        try:
+            pool.submit({"job_id": "pool-test-2", "file_path": str(tmp_path / "missing.pdf"), "chunk_size": 5})
+            assert done.wait(timeout=60)
+        finally:
+            pool.shutdown()
+
+        assert collected[-1][1] == "error"
+        assert collected[-1][2] == "failed"
+
+    def test_worker_crash_is_reported_and_pool_recovers(self, events, valid_pdf_1_page, tmp_path):
+        """Test that a dying worker reports a crash and later jobs still run"""
+        collected, done, on_event = events
+        input_path = str(tmp_path / "input.pdf")
+        shutil.copy(valid_pdf_1_page, input_path)
+
+        pool = JobWorkerPool(on_event=on_event, max_workers=1)
+        try:
+            pool._submit("pool-test-3", _crash_job, "pool-test-3")
+            assert done.wait(timeout=60)
+            assert collected[-1][:3] == ("pool-test-3", "error", "crashed")
+            assert pool.has_free_slot()
+
+            done.clear()
+            pool.submit({"job_id": "pool-test-4", "file_path": input_path, "chunk_size": 5})
+            assert done.wait(timeout=60)
+        finally:
+            pool.shutdown()
+
+        assert collected[-1][:2] == ("pool-test-4", "finished")
+        os.remove(collected[-1][2])
@@ -2,10 +2,17 @@
 Helper utility functions
 """
 import os
+import re
 import uuid
 import shutil
 from typing import Optional
 import config
+from utils.logger import get_logger
+
+logger = get_logger("watermarks.helpers")
+
+# Job IDs are str(uuid4()): 36 lowercase hex digits and dashes
+_JOB_ID_RE = re.compile(r"^[0-9a-f-]{36}$")
 
 
 def generate_job_id() -> str:
@@ -33,6 +40,25 @@ def ensure_directories_exist():
         os.makedirs(directory, exist_ok=True)
 
 
+def open_for_write(file_path: str):
+    """
+    Open a job file for binary writing.
+    Directories are created once at startup; the common case is a single
+    open(), and the directory is only recreated if something removed it.
+    
+    Args:
+        file_path: Path of the file to create
+        
+    Returns:
+        Binary file object
+    """
+    try:
+        return open(file_path, "wb")
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        return open(file_path, "wb")
+
+
 def cleanup_job_files(job_id: str) -> bool:
     """
     Clean up all files associated with a job.
@@ -44,24 +70,22 @@ def cleanup_job_files(job_id: str) -> bool:
         True if cleanup successful
     """
     try:
-        # Remove processing directory
-        job_dir = os.path.join(config.PROCESSING_DIR, job_id)
-        if os.path.exists(job_dir):
-            shutil.rmtree(job_dir)
-        
-        # Remove uploaded file
-        upload_path = os.path.join(config.UPLOAD_DIR, f"{job_id}.pdf")
-        if os.path.exists(upload_path):
-            os.remove(upload_path)
+        # Remove processing directory (chunks) in one walk; missing is fine
+        shutil.rmtree(os.path.join(config.PROCESSING_DIR, job_id), ignore_errors=True)
         
-        # Remove output file
-        output_path = os.path.join(config.OUTPUT_DIR, f"watermarked_{job_id}.pdf")
-        if os.path.exists(output_path):
-            os.remove(output_path)
+        # Remove uploaded and output files (unlink directly rather than stat first)
+        for path in (
+            os.path.join(config.UPLOAD_DIR, f"{job_id}.pdf"),
+            os.path.join(config.OUTPUT_DIR, f"watermarked_{job_id}.pdf"),
+        ):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
         
         return True
     except Exception as e:
-        print(f"Error cleaning up job {job_id}: {str(e)}")
+        logger.error("Error cleaning up job %s: %s", job_id, e)
         return False
 
 
@@ -78,6 +102,19 @@ def get_file_extension(filename: str) -> str:
     return os.path.splitext(filename)[1].lower()
 
 
+def is_valid_job_id(job_id: str) -> bool:
+    """
+    Check if a string looks like a job ID from generate_job_id.
+    
+    Args:
+        job_id: Job identifier from the request
+        
+    Returns:
+        True if job_id is well-formed
+    """
+    return _JOB_ID_RE.match(job_id) is not None
+
+
 def is_allowed_file(filename: str) -> bool:
     """
     Check if file extension is allowed.
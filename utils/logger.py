@@ -0,0 +1,69 @@
+"""
+Logging setup - log records are handed to a queue and written by a background thread
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import config
+
+
+_listener: logging.handlers.QueueListener = None
+_setup_lock = threading.Lock()
+
+
+def _setup():
+    """Attach the queue handler and start the listener thread (once per process)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, _stream_handler())
+        _listener.start()
+        atexit.register(_listener.stop)  # Flush anything still queued
+
+        root = logging.getLogger("watermarks")
+        root.setLevel(logging.DEBUG if config.DEBUG else logging.INFO)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.propagate = False
+
+        # Worker processes are forked from a forkserver that imported this module,
+        # so they inherit the queue handler but not the listener thread
+        os.register_at_fork(after_in_child=_setup_forked_child)
+
+
+def _stream_handler() -> logging.Handler:
+    """Handler that writes formatted records to stdout"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+def _setup_forked_child():
+    """Write records straight to stdout in a forked child (its parent's listener thread isn't running here)"""
+    root = logging.getLogger("watermarks")
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_stream_handler())
+
+
+def get_logger(name: str = "watermarks") -> logging.Logger:
+    """
+    Get a logger under the "watermarks" hierarchy.
+    Callers never block on stdout: records go through a queue to a listener thread.
+    Pass arguments %-style (logger.debug("job %s", job_id)) so messages below
+    the configured level are never formatted.
+
+    Args:
+        name: Logger name ("watermarks" or "watermarks.<module>")
+
+    Returns:
+        Logger instance
+    """
+    _setup()
+    return logging.getLogger(name)
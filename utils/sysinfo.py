@@ -0,0 +1,113 @@
+"""
+System information helpers - short-lived caches around psutil and disk usage calls
+"""
+import os
+import shutil
+import threading
+import time
+import psutil
+import config
+
+
+_memory_lock = threading.Lock()
+_memory_cache = {"t": 0.0, "v": None}
+_rss_cache = {"t": 0.0, "v": None}
+_children_rss_cache = {"t": 0.0, "v": None}
+_disk_lock = threading.Lock()
+_disk_cache = {}  # path -> (timestamp, usage)
+_process = None  # psutil.Process for this process (constructing one reads /proc)
+
+
+def get_virtual_memory():
+    """
+    Get psutil.virtual_memory(), reusing the last snapshot for up to
+    SYSINFO_CACHE_SECONDS so health checks and size checks don't each hit /proc.
+    
+    Returns:
+        psutil virtual memory snapshot
+    """
+    now = time.monotonic()
+    with _memory_lock:
+        if _memory_cache["v"] is None or now - _memory_cache["t"] > config.SYSINFO_CACHE_SECONDS:
+            _memory_cache.update(t=now, v=psutil.virtual_memory())
+        return _memory_cache["v"]
+
+
+def _current_process() -> psutil.Process:
+    """psutil handle for this process, created once (and again in a forked child)"""
+    global _process
+    if _process is None or _process.pid != os.getpid():
+        _process = psutil.Process()
+    return _process
+
+
+def get_process_rss() -> int:
+    """
+    Get this process's resident memory, cached like get_virtual_memory().
+    
+    Returns:
+        RSS in bytes
+    """
+    now = time.monotonic()
+    with _memory_lock:
+        if _rss_cache["v"] is None or now - _rss_cache["t"] > config.SYSINFO_CACHE_SECONDS:
+            _rss_cache.update(t=now, v=_current_process().memory_info().rss)
+        return _rss_cache["v"]
+
+
+def _sum_children_rss() -> int:
+    total = 0
+    for child in _current_process().children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass  # Exited since it was listed
+    return total
+
+
+def get_children_rss() -> int:
+    """
+    Get the combined resident memory of all descendant processes (job pool
+    workers, their forkservers and chunk workers), cached like get_process_rss().
+    
+    Returns:
+        RSS in bytes
+    """
+    now = time.monotonic()
+    with _memory_lock:
+        if _children_rss_cache["v"] is None or now - _children_rss_cache["t"] > config.SYSINFO_CACHE_SECONDS:
+            _children_rss_cache.update(t=now, v=_sum_children_rss())
+        return _children_rss_cache["v"]
+
+
+def get_disk_usage(path: str):
+    """
+    Get shutil.disk_usage(path), cached like get_virtual_memory() so admission
+    checks don't each statvfs the temp directory.
+    
+    Args:
+        path: Any path on the filesystem to check
+        
+    Returns:
+        shutil disk usage (total, used, free)
+    """
+    now = time.monotonic()
+    with _disk_lock:
+        cached = _disk_cache.get(path)
+        if cached is None or now - cached[0] > config.SYSINFO_CACHE_SECONDS:
+            cached = (now, shutil.disk_usage(path))
+            _disk_cache[path] = cached
+        return cached[1]
+
+
+def refresh_disk_usage(path: str):
+    """
+    Re-read disk usage for path into the cache right away (e.g. after files
+    were deleted), so the next admission check sees the freed space.
+    
+    Args:
+        path: Any path on the filesystem to check
+    """
+    usage = shutil.disk_usage(path)
+    with _disk_lock:
+        _disk_cache[path] = (time.monotonic(), usage)